@@ -1,17 +1,190 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash, send_from_directory, g, has_request_context
+import csv
+import io
 import json
+import gzip
+import bisect
+import click
 import hashlib
+import hmac
+import heapq
+import itertools
+import math
 from functools import wraps
 from datetime import datetime
 import os
+import sys
+import atexit
+import mimetypes
+import signal
+import threading
+import time
 from typing import Dict, List, Any
 import traceback
+import unicodedata
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional: sem ele, apenas gzip é gerado
+    brotli = None
+
+try:
+    import numpy as np
+except ImportError:  # numpy é opcional: sem ele, a previsão de demanda fica indisponível
+    np = None
 
 app = Flask(__name__)
 app.secret_key = 'turma_do_forno_secret_key_2025'
 
+# Quantidade de produtos exibidos no PDV antes de uma busca
+LIMITE_PRODUTOS_PDV = 60
+
+# Arquivos estáticos servidos com nome versionado (hash do conteúdo) e cache longo
+ASSETS_VERSIONADOS = ['css/style.css', 'js/script.js', 'images/logo.png']
+ASSETS_DIR = os.path.join(app.static_folder, 'dist')
+ASSETS_COMPRIMIVEIS = ('.css', '.js')
+
+# Formatos de data já gravados nos JSON (pedidos às vezes sem segundos)
+FORMATOS_DATA = ('%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y', '%Y-%m-%d %H:%M', '%Y-%m-%d')
+
+# Filas de atendimento dos pedidos de pré-venda
+STATUS_FILA_PRE_VENDA = {
+    'pendente_pagamento': 'Aguardando pagamento',
+    'pendente_entrega': 'Aguardando retirada',
+    'completo': 'Completos'
+}
+PEDIDOS_POR_PAGINA = 25
+
+# Listagens de equipe e de clientes
+USUARIOS_POR_PAGINA = 25
+
+# Custo do hash de senha (PBKDF2-SHA256); hashes com outro custo são refeitos no próximo login
+PBKDF2_ITERACOES = int(os.environ.get('PADARIA_PBKDF2_ITERACOES', '260000'))
+
+# Intervalo mínimo entre checkpoints automáticos de estoque
+INTERVALO_CHECKPOINT_HORAS = 24
+
+# Versão do formato dos dados; sobe sempre que uma migração nova é adicionada
+VERSAO_DADOS = 1
+ARQUIVO_VERSAO_DADOS = 'database/versao_dados.json'
+
+# Último id entregue por sequência; equipe e clientes compartilham a sequência 'contas'
+ARQUIVO_SEQUENCIAS = 'database/sequencias.json'
+SEQUENCIAS_COMPARTILHADAS = {'users': 'contas', 'clientes': 'contas'}
+
+# Coleções cujos registros têm id, na ordem da verificação de integridade (produtos antes das movimentações)
+COLECOES_COM_ID = ('produtos', 'users', 'clientes', 'vendas', 'movimentacoes', 'pedidos', 'pre_vendas',
+                   'recebimentos', 'checkpoints_estoque')
+
+# Coleções de histórico com índice temporal ordenado
+COLECOES_TEMPORAIS = ('vendas', 'movimentacoes', 'pedidos')
+
+# Escrita adiada (write-behind): coleções quentes ficam em memória e são gravadas
+# em lote a cada JANELA_PERDA_SEGUNDOS, que é também a perda máxima em caso de queda
+ESCRITA_ADIADA = os.environ.get('PADARIA_ESCRITA_ADIADA', '0') == '1'
+JANELA_PERDA_SEGUNDOS = float(os.environ.get('PADARIA_JANELA_PERDA_SEGUNDOS', '1.0'))
+# Recebimentos e checkpoints descrevem estoque e movimentações: ficam na mesma janela e são gravados
+# por último, para um recebimento ou checkpoint nunca chegar ao disco antes do que ele registra
+COLECOES_ADIADAS = ('produtos', 'vendas', 'movimentacoes', 'pontos', 'pedidos', 'resumo_vendas_diario',
+                    'recebimentos', 'checkpoints_estoque')
+# Coleções em que as rotas só acrescentam registros: a leitura copia a lista, mas compartilha os registros
+COLECOES_SO_ACRESCIMO = ('vendas', 'movimentacoes', 'recebimentos', 'checkpoints_estoque')
+
+_colecoes_em_memoria: Dict[str, List[Dict[str, Any]]] = {}
+_colecoes_sujas: set = set()
+_trava_colecoes = threading.RLock()
+# Os índices em memória são montados sob esta trava, para o aquecimento em segundo plano
+# e as requisições nunca verem um índice pela metade
+_trava_indices = threading.RLock()
+# Uma descarga por vez (thread do gravador, atexit e SIGTERM podem coincidir)
+_trava_gravacao = threading.Lock()
+_gravador: Dict[str, Any] = {'thread': None}
+
+def _copiar_registro(registro: Dict[str, Any]) -> Dict[str, Any]:
+    return {chave: valor.copy() if isinstance(valor, (dict, list)) else valor for chave, valor in registro.items()}
+
+def _copiar(arquivo: str, dados: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # As rotas alteram os registros carregados antes de decidir se salvam (ex.: baixa de
+    # estoque seguida de "Estoque insuficiente"); a cópia mantém a memória intacta até salvar_dados.
+    # Vendas e movimentações só ganham registros novos, então basta copiar a lista
+    if arquivo in COLECOES_SO_ACRESCIMO:
+        return list(dados)
+    return [_copiar_registro(registro) for registro in dados]
+
+def _gravar_arquivo(arquivo: str, dados: List[Dict[str, Any]]) -> None:
+    caminho_arquivo = f'database/{arquivo}.json'
+    os.makedirs(os.path.dirname(caminho_arquivo), exist_ok=True)
+    with open(caminho_arquivo + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(dados, f, indent=4, ensure_ascii=False)
+    os.replace(caminho_arquivo + '.tmp', caminho_arquivo)
+
+def descarregar_colecoes() -> None:
+    """Grava em disco as coleções alteradas desde a última descarga"""
+    with _trava_gravacao:
+        # A sequência vai antes das coleções: numa queda entre as duas sobra só uma lacuna de ids
+        persistir_sequencias()
+        with _trava_colecoes:
+            # salvar_dados troca a lista inteira, então a referência já é um retrato consistente
+            pendentes = [(arquivo, _colecoes_em_memoria[arquivo])
+                         for arquivo in sorted(_colecoes_sujas, key=COLECOES_ADIADAS.index)]
+            _colecoes_sujas.clear()
+        falhas = []
+        for arquivo, dados in pendentes:
+            try:
+                _gravar_arquivo(arquivo, dados)
+            except Exception as e:
+                # Volta para a lista de pendentes e é tentada de novo na próxima descarga
+                with _trava_colecoes:
+                    _colecoes_sujas.add(arquivo)
+                falhas.append(f"{arquivo}: {e}")
+        if falhas:
+            raise OSError('Falha ao gravar ' + '; '.join(falhas))
+
+def _laco_gravador() -> None:
+    while True:
+        time.sleep(JANELA_PERDA_SEGUNDOS)
+        try:
+            descarregar_colecoes()
+        except Exception as e:
+            print(f"❌ Erro ao gravar coleções: {e}")
+
+def _iniciar_gravador() -> None:
+    if _gravador['thread'] is None:
+        _gravador['thread'] = threading.Thread(target=_laco_gravador, name='gravador-colecoes', daemon=True)
+        _gravador['thread'].start()
+        atexit.register(descarregar_colecoes)
+
+def _descarregar_ao_encerrar(sinal, frame) -> None:
+    try:
+        descarregar_colecoes()
+    finally:
+        anterior = _gravador.get('sigterm_anterior')
+        if callable(anterior):
+            anterior(sinal, frame)
+        else:
+            raise SystemExit(128 + sinal)
+
+def _instalar_descarga_no_encerramento() -> None:
+    """atexit não roda com SIGTERM (deploys, systemd, docker stop): descarrega também nele"""
+    try:
+        _gravador['sigterm_anterior'] = signal.signal(signal.SIGTERM, _descarregar_ao_encerrar)
+    except ValueError:
+        # Só a thread principal pode instalar tratadores de sinal (ex.: import dentro de um worker)
+        pass
+
+if ESCRITA_ADIADA:
+    _instalar_descarga_no_encerramento()
+
 # Função para carregar dados do JSON
 def carregar_dados(arquivo: str) -> List[Dict[str, Any]]:
+    if ESCRITA_ADIADA and arquivo in COLECOES_ADIADAS:
+        with _trava_colecoes:
+            if arquivo not in _colecoes_em_memoria:
+                _colecoes_em_memoria[arquivo] = _ler_arquivo(arquivo)
+            return _copiar(arquivo, _colecoes_em_memoria[arquivo])
+    return _ler_arquivo(arquivo)
+
+def _ler_arquivo(arquivo: str) -> List[Dict[str, Any]]:
     caminho_arquivo = f'database/{arquivo}.json'
     os.makedirs(os.path.dirname(caminho_arquivo), exist_ok=True)
     try:
@@ -22,12 +195,128 @@ def carregar_dados(arquivo: str) -> List[Dict[str, Any]]:
             json.dump([], f, indent=4, ensure_ascii=False)
         return []
 
+# Início de cada registro no formato gravado por _gravar_arquivo (lista com indent=4)
+SEPARADOR_REGISTROS = b'\n    {\n'
+
+def iterar_registros_do_fim(arquivo: str, tamanho_bloco: int = 1 << 16):
+    """Registros do mais novo para o mais antigo, lendo o arquivo de trás para frente em blocos.
+
+    Quem para cedo (ex.: ao chegar no último registro já aplicado) lê só o fim do arquivo.
+    """
+    if ESCRITA_ADIADA and arquivo in COLECOES_ADIADAS:
+        yield from reversed(carregar_dados(arquivo))
+        return
+    caminho_arquivo = f'database/{arquivo}.json'
+    try:
+        f = open(caminho_arquivo, 'rb')
+    except FileNotFoundError:
+        return
+    with f:
+        if f.read(len(SEPARADOR_REGISTROS) + 1) != b'[' + SEPARADOR_REGISTROS:
+            # Vazio ou gravado em outro formato: lê inteiro
+            yield from reversed(_ler_arquivo(arquivo))
+            return
+        posicao = f.seek(0, os.SEEK_END)
+        buffer = b''
+        while posicao > 0:
+            tamanho = min(tamanho_bloco, posicao)
+            posicao -= tamanho
+            f.seek(posicao)
+            partes = (f.read(tamanho) + buffer).split(SEPARADOR_REGISTROS)
+            # A primeira parte pode ser um registro cortado: fica para o próximo bloco
+            buffer = partes[0]
+            for parte in reversed(partes[1:]):
+                yield json.loads(b'{\n' + parte.rstrip().rstrip(b']').rstrip().rstrip(b','))
+
 # Função para salvar dados no JSON
 def salvar_dados(arquivo: str, dados: List[Dict[str, Any]]) -> None:
-    caminho_arquivo = f'database/{arquivo}.json'
-    os.makedirs(os.path.dirname(caminho_arquivo), exist_ok=True)
-    with open(caminho_arquivo, 'w', encoding='utf-8') as f:
-        json.dump(dados, f, indent=4, ensure_ascii=False)
+    _confirmar_ids_reservados(arquivo)
+    if ESCRITA_ADIADA and arquivo in COLECOES_ADIADAS:
+        with _trava_colecoes:
+            # Cópia da lista: o chamador pode continuar mexendo na sua enquanto o gravador serializa esta
+            _colecoes_em_memoria[arquivo] = list(dados)
+            _colecoes_sujas.add(arquivo)
+        _iniciar_gravador()
+    else:
+        # A sequência vai antes da coleção: numa queda entre as duas sobra só uma lacuna de ids
+        persistir_sequencias()
+        _gravar_arquivo(arquivo, dados)
+    if arquivo == 'produtos':
+        _sincronizar_produtos_indexados(dados)
+    elif arquivo in COLECOES_TEMPORAIS:
+        _sincronizar_indice_tempo(arquivo, dados)
+
+# ============= SEQUÊNCIAS DE IDS =============
+
+# Os ids são reservados em memória; o arquivo só é gravado junto com o salvamento de uma coleção.
+# Ids reservados por uma requisição que não chegou a salvar são devolvidos no fim dela.
+_sequencias: Dict[str, int] = {}
+_sequencias_gravadas: Dict[str, int] = {}
+_trava_sequencias = threading.Lock()
+
+def _colecoes_da_sequencia(sequencia: str) -> List[str]:
+    colecoes = [c for c, s in SEQUENCIAS_COMPARTILHADAS.items() if s == sequencia]
+    return colecoes or [sequencia]
+
+def _carregar_sequencias() -> Dict[str, int]:
+    if not _sequencias:
+        try:
+            with open(ARQUIVO_SEQUENCIAS, 'r', encoding='utf-8') as f:
+                _sequencias.update(json.load(f))
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+        _sequencias_gravadas.update(_sequencias)
+    return _sequencias
+
+def persistir_sequencias() -> None:
+    """Grava as sequências se algum id foi entregue desde a última gravação"""
+    with _trava_sequencias:
+        if _sequencias == _sequencias_gravadas:
+            return
+        os.makedirs(os.path.dirname(ARQUIVO_SEQUENCIAS), exist_ok=True)
+        with open(ARQUIVO_SEQUENCIAS + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(_sequencias, f, indent=4)
+        os.replace(ARQUIVO_SEQUENCIAS + '.tmp', ARQUIVO_SEQUENCIAS)
+        _sequencias_gravadas.clear()
+        _sequencias_gravadas.update(_sequencias)
+
+def proximo_id(colecao: str) -> int:
+    """Próximo id da coleção: nunca reaproveitado, mesmo depois de exclusões"""
+    sequencia = SEQUENCIAS_COMPARTILHADAS.get(colecao, colecao)
+    with _trava_sequencias:
+        sequencias = _carregar_sequencias()
+        if sequencia not in sequencias:
+            # Primeira vez: continua do maior id já gravado
+            sequencias[sequencia] = max((r['id'] for c in _colecoes_da_sequencia(sequencia)
+                                         for r in carregar_dados(c) if isinstance(r.get('id'), int)), default=0)
+        sequencias[sequencia] += 1
+        novo_id = sequencias[sequencia]
+    if has_request_context():
+        g.setdefault('ids_reservados', {}).setdefault(sequencia, set()).add(novo_id)
+    return novo_id
+
+def _confirmar_ids_reservados(colecao: str) -> None:
+    # Chamado por salvar_dados: os ids da coleção salva deixam de ser devolvíveis
+    if has_request_context() and 'ids_reservados' in g:
+        g.ids_reservados.pop(SEQUENCIAS_COMPARTILHADAS.get(colecao, colecao), None)
+
+@app.teardown_request
+def _devolver_ids_reservados(erro=None) -> None:
+    """Devolve os ids de coleções que a requisição reservou e não salvou (ex.: estoque insuficiente)"""
+    reservados = g.pop('ids_reservados', {})
+    with _trava_sequencias:
+        for sequencia, ids in reservados.items():
+            # Só o topo da sequência volta; ids de outras requisições no meio ficam como lacuna
+            while _sequencias.get(sequencia) in ids:
+                _sequencias[sequencia] -= 1
+
+def ajustar_sequencia(sequencia: str, minimo: int) -> None:
+    """Garante que a sequência não entregue ids menores ou iguais a minimo"""
+    with _trava_sequencias:
+        sequencias = _carregar_sequencias()
+        if sequencias.get(sequencia, -1) < minimo:
+            sequencias[sequencia] = minimo
+    persistir_sequencias()
 
 # Decorator para verificar login
 def login_required(f):
@@ -54,6 +343,14 @@ def permission_required(permission):
             if 'user_id' not in session:
                 return redirect(url_for('login'))
 
+            # Cliente só tem acesso à pré-venda (clientes ficam em outra coleção)
+            if session.get('user_tipo') == 'cliente':
+                if f.__name__ == 'pre_venda':
+                    return f(*args, **kwargs)
+                else:
+                    flash("Acesso restrito. Clientes só podem acessar a área de compras.", "error")
+                    return redirect(url_for('pre_venda'))
+
             users = carregar_dados('users')
             user = next((u for u in users if u['id'] == session['user_id']), None)
 
@@ -61,14 +358,6 @@ def permission_required(permission):
             if user and user['tipo'] == 'admin':
                 return f(*args, **kwargs)
             
-            # Cliente só tem acesso à pré-venda
-            if user and user['tipo'] == 'cliente':
-                if f.__name__ == 'pre_venda':
-                    return f(*args, **kwargs)
-                else:
-                    flash("Acesso restrito. Clientes só podem acessar a área de compras.", "error")
-                    return redirect(url_for('pre_venda'))
-            
             # Outros usuários verificam permissões específicas
             if user and permission in user.get('permissoes', []):
                 return f(*args, **kwargs)
@@ -111,6 +400,8 @@ def migrar_status_pedidos():
         
         if pedidos_modificados:
             salvar_dados('pedidos', pedidos)
+            for pedido in pedidos:
+                indexar_pedido(pedido)
             print("✅ Migração de status concluída com sucesso!")
         else:
             print("✅ Nenhuma migração necessária - status já estão atualizados")
@@ -133,6 +424,1043 @@ def migrar_status():
     
     return redirect(url_for('relatorios_vendas_online'))
 
+# ============= ASSETS ESTÁTICOS =============
+
+_manifest_assets: Dict[str, str] = {}
+
+def _gravar_asset(destino: str, gerar_conteudo) -> None:
+    """Grava via arquivo temporário + os.replace: quem lê nunca vê um asset pela metade.
+
+    O nome leva o hash do conteúdo, então um arquivo que já existe está completo e é pulado.
+    """
+    if os.path.exists(destino):
+        return
+    temporario = f"{destino}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporario, 'wb') as f:
+        f.write(gerar_conteudo())
+    os.replace(temporario, destino)
+
+def construir_assets() -> Dict[str, str]:
+    """Gera cópias versionadas (e pré-comprimidas) dos assets e o manifesto"""
+    manifest = {}
+    for nome in ASSETS_VERSIONADOS:
+        origem = os.path.join(app.static_folder, nome)
+        if not os.path.exists(origem):
+            continue
+        with open(origem, 'rb') as f:
+            conteudo = f.read()
+
+        base, extensao = os.path.splitext(nome)
+        versionado = f"{base}.{hashlib.md5(conteudo).hexdigest()[:10]}{extensao}"
+        destino = os.path.join(ASSETS_DIR, versionado)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        _gravar_asset(destino, lambda: conteudo)
+
+        # Imagens já são comprimidas; só texto ganha .gz/.br
+        if extensao in ASSETS_COMPRIMIVEIS:
+            _gravar_asset(destino + '.gz', lambda: gzip.compress(conteudo, compresslevel=9))
+            if brotli:
+                _gravar_asset(destino + '.br', lambda: brotli.compress(conteudo))
+
+        manifest[nome] = versionado
+
+    os.makedirs(ASSETS_DIR, exist_ok=True)
+    caminho_manifest = os.path.join(ASSETS_DIR, 'manifest.json')
+    temporario = f"{caminho_manifest}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(temporario, caminho_manifest)
+    _manifest_assets.clear()
+    _manifest_assets.update(manifest)
+    return manifest
+
+def _carregar_manifest_assets() -> Dict[str, str]:
+    if not _manifest_assets:
+        try:
+            with open(os.path.join(ASSETS_DIR, 'manifest.json'), 'r', encoding='utf-8') as f:
+                _manifest_assets.update(json.load(f))
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+    return _manifest_assets
+
+def url_for_assets(endpoint: str, **values) -> str:
+    """url_for dos templates: troca url_for('static', ...) pela versão com hash, se existir"""
+    if endpoint == 'static':
+        versionado = _carregar_manifest_assets().get(values.get('filename'))
+        if versionado:
+            return url_for('assets', filename=versionado)
+    return url_for(endpoint, **values)
+
+app.jinja_env.globals['url_for'] = url_for_assets
+
+@app.route('/assets/<path:filename>')
+def assets(filename):
+    """Serve assets versionados com cache imutável e versão pré-comprimida"""
+    aceita = request.headers.get('Accept-Encoding', '')
+    mimetype = mimetypes.guess_type(filename)[0]
+    encoding = None
+    arquivo = filename
+    for sufixo, nome_encoding in (('.br', 'br'), ('.gz', 'gzip')):
+        if nome_encoding in aceita and os.path.exists(os.path.join(ASSETS_DIR, filename + sufixo)):
+            arquivo = filename + sufixo
+            encoding = nome_encoding
+            break
+
+    resposta = send_from_directory(ASSETS_DIR, arquivo, mimetype=mimetype, max_age=31536000)
+    resposta.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    resposta.headers['Vary'] = 'Accept-Encoding'
+    if encoding:
+        resposta.headers['Content-Encoding'] = encoding
+    return resposta
+
+@app.cli.command('construir-assets')
+def construir_assets_command():
+    """Gera os assets estáticos versionados e pré-comprimidos"""
+    manifest = construir_assets()
+    print(f"✅ {len(manifest)} assets versionados em {ASSETS_DIR}")
+
+# ============= ÍNDICE DE BUSCA DE PRODUTOS =============
+
+# Índice em memória: prefixos curtos (1-2 letras) e trigramas das palavras de nome/categoria
+# 'ordenados' guarda, por prefixo curto, os ids já na ordem de exibição (montado na primeira busca)
+_indice_produtos: Dict[str, Any] = {'carregado': False, 'prefixos': {}, 'trigramas': {}, 'textos': {}, 'produtos': {},
+                                    'ordenados': {}}
+
+def normalizar_texto(texto: str) -> str:
+    """Minúsculas e sem acentos, para comparações de busca"""
+    decomposto = unicodedata.normalize('NFKD', str(texto or ''))
+    return ''.join(c for c in decomposto if not unicodedata.combining(c)).lower()
+
+def _trigramas(palavra: str) -> set:
+    return {palavra[i:i + 3] for i in range(len(palavra) - 2)}
+
+def indexar_produto(produto: Dict[str, Any]) -> None:
+    """Adiciona (ou reindexa) um produto no índice de busca"""
+    _garantir_indice_produtos()
+    desindexar_produto(produto['id'])
+    texto = normalizar_texto(f"{produto.get('nome', '')} {produto.get('categoria', '')}")
+    _indice_produtos['textos'][produto['id']] = texto
+    _indice_produtos['produtos'][produto['id']] = produto
+    for palavra in texto.split():
+        for tamanho in (1, 2):
+            _indice_produtos['prefixos'].setdefault(palavra[:tamanho], set()).add(produto['id'])
+            _indice_produtos['ordenados'].pop(palavra[:tamanho], None)
+        for trigrama in _trigramas(palavra):
+            _indice_produtos['trigramas'].setdefault(trigrama, set()).add(produto['id'])
+
+def desindexar_produto(produto_id: int) -> None:
+    """Remove um produto do índice de busca"""
+    texto = _indice_produtos['textos'].pop(produto_id, None)
+    _indice_produtos['produtos'].pop(produto_id, None)
+    if texto is None:
+        return
+    for palavra in texto.split():
+        for tamanho in (1, 2):
+            _indice_produtos['prefixos'].get(palavra[:tamanho], set()).discard(produto_id)
+            _indice_produtos['ordenados'].pop(palavra[:tamanho], None)
+        for trigrama in _trigramas(palavra):
+            _indice_produtos['trigramas'].get(trigrama, set()).discard(produto_id)
+
+def _garantir_indice_produtos() -> None:
+    """Constrói o índice completo na primeira utilização"""
+    with _trava_indices:
+        if _indice_produtos['carregado']:
+            return
+        _indice_produtos['carregado'] = True
+        for produto in carregar_dados('produtos'):
+            indexar_produto(produto)
+
+def _sincronizar_produtos_indexados(produtos: List[Dict[str, Any]]) -> None:
+    """Atualiza preço/estoque dos produtos indexados sem retokenizar"""
+    if _indice_produtos['carregado']:
+        _indice_produtos['produtos'] = {p['id']: p for p in produtos}
+
+def _ids_ordenados_por_prefixo(prefixo: str) -> List[int]:
+    """Ids do prefixo curto na ordem da busca; ordenado uma vez e descartado quando o prefixo muda"""
+    with _trava_indices:
+        if prefixo not in _indice_produtos['ordenados']:
+            textos = _indice_produtos['textos']
+            _indice_produtos['ordenados'][prefixo] = sorted(
+                _indice_produtos['prefixos'].get(prefixo, ()),
+                key=lambda produto_id: (not textos[produto_id].startswith(prefixo), textos[produto_id]))
+        return _indice_produtos['ordenados'][prefixo]
+
+def buscar_produtos(termo: str, limite: int = 20) -> List[Dict[str, Any]]:
+    """Busca produtos por nome/categoria, ignorando acentos e maiúsculas"""
+    _garantir_indice_produtos()
+    palavras = normalizar_texto(termo).split()
+    if not palavras:
+        return []
+
+    # Primeira palavra de 1-2 letras (primeiras teclas do PDV): a lista do prefixo já está na ordem
+    # de exibição, então basta percorrê-la até achar `limite` resultados, sem filtrar o balde inteiro
+    ordenados = _ids_ordenados_por_prefixo(palavras[0]) if len(palavras[0]) < 3 else None
+
+    candidatos = None
+    for palavra in (palavras[1:] if ordenados is not None else palavras):
+        if len(palavra) < 3:
+            ids = _indice_produtos['prefixos'].get(palavra, set())
+        else:
+            conjuntos = [_indice_produtos['trigramas'].get(t, set()) for t in _trigramas(palavra)]
+            ids = set.intersection(*conjuntos)
+        candidatos = set(ids) if candidatos is None else candidatos & ids
+        if not candidatos:
+            return []
+
+    textos = _indice_produtos['textos']
+    produtos = _indice_produtos['produtos']
+
+    def corresponde(produto_id):
+        texto = textos.get(produto_id, '')
+        palavras_texto = texto.split()
+        return produto_id in produtos and all(
+            any(p.startswith(palavra) for p in palavras_texto) or (len(palavra) >= 3 and palavra in texto)
+            for palavra in palavras)
+
+    if ordenados is not None:
+        encontrados = (produto_id for produto_id in ordenados
+                       if (candidatos is None or produto_id in candidatos) and corresponde(produto_id))
+        return [produtos[produto_id] for produto_id in itertools.islice(encontrados, limite)]
+
+    # Prefixo no início do nome vem primeiro; só os `limite` melhores são ordenados
+    melhores = heapq.nsmallest(limite, filter(corresponde, candidatos),
+                               key=lambda produto_id: (not textos[produto_id].startswith(palavras[0]), textos[produto_id]))
+    return [produtos[produto_id] for produto_id in melhores]
+
+@app.route('/api/buscar_produtos')
+@login_required
+def api_buscar_produtos():
+    termo = request.args.get('q', '')
+    # Valor não numérico volta ao padrão; fora da faixa fica entre 1 e 100
+    limite = max(1, min(request.args.get('limite', 20, type=int), 100))
+    resultados = buscar_produtos(termo, limite)
+    return jsonify([{
+        'id': p['id'],
+        'nome': p['nome'],
+        'preco': p['preco'],
+        'quantidade': p['quantidade'],
+        'categoria': p.get('categoria', '')
+    } for p in resultados])
+
+# ============= DATAS E ÍNDICE TEMPORAL =============
+
+# Por coleção: timestamps ordenados e as chaves (timestamp, id) na mesma ordem
+_indices_tempo: Dict[str, Dict[str, Any]] = {}
+
+def converter_data(texto: str) -> Any:
+    """Converte uma data textual em timestamp (epoch), ou None se inválida"""
+    for formato in FORMATOS_DATA:
+        try:
+            return datetime.strptime(texto, formato).timestamp()
+        except (TypeError, ValueError):
+            continue
+    return None
+
+def timestamp_de_data_informada(texto: str) -> float:
+    """Timestamp de uma data digitada pelo usuário; hoje (ou inválida) vira o instante atual"""
+    timestamp = converter_data(texto)
+    if timestamp is None or datetime.fromtimestamp(timestamp).date() == datetime.now().date():
+        return datetime.now().timestamp()
+    return timestamp
+
+def timestamp_do_registro(registro: Dict[str, Any], campo: str = 'data') -> float:
+    """Timestamp normalizado do registro, convertendo a data textual se faltar"""
+    if registro.get('timestamp') is not None:
+        return registro['timestamp']
+    return converter_data(registro.get(campo, '')) or 0.0
+
+def _garantir_indice_tempo(colecao: str) -> Dict[str, Any]:
+    with _trava_indices:
+        if colecao not in _indices_tempo:
+            chaves = sorted((timestamp_do_registro(r), r.get('id')) for r in carregar_dados(colecao))
+            _indices_tempo[colecao] = {
+                'timestamps': [t for t, _ in chaves],
+                'chaves': chaves,
+                'conjunto': set(chaves)
+            }
+        return _indices_tempo[colecao]
+
+def _sincronizar_indice_tempo(colecao: str, registros: List[Dict[str, Any]]) -> None:
+    """Insere/remove no índice só os registros que mudaram desde o último salvamento"""
+    indice = _indices_tempo.get(colecao)
+    if indice is None:
+        return
+    atuais = {(timestamp_do_registro(r), r.get('id')) for r in registros}
+    for chave in indice['conjunto'] - atuais:
+        posicao = bisect.bisect_left(indice['chaves'], chave)
+        del indice['chaves'][posicao]
+        del indice['timestamps'][posicao]
+    for chave in atuais - indice['conjunto']:
+        posicao = bisect.bisect_right(indice['chaves'], chave)
+        indice['chaves'].insert(posicao, chave)
+        indice['timestamps'].insert(posicao, chave[0])
+    indice['conjunto'] = atuais
+
+def ids_no_periodo(colecao: str, inicio: float, fim: float) -> List[Any]:
+    """Ids dos registros com timestamp em [inicio, fim], por busca binária"""
+    indice = _garantir_indice_tempo(colecao)
+    esquerda = bisect.bisect_left(indice['timestamps'], inicio)
+    direita = bisect.bisect_right(indice['timestamps'], fim)
+    return [registro_id for _, registro_id in indice['chaves'][esquerda:direita]]
+
+def registros_no_periodo(colecao: str, inicio: float, fim: float) -> List[Dict[str, Any]]:
+    """Registros da coleção no período, em ordem cronológica"""
+    ids = ids_no_periodo(colecao, inicio, fim)
+    if not ids:
+        return []
+    # Os registros são acrescentados em ordem de gravação: períodos recentes ficam no fim do arquivo
+    faltando = set(ids)
+    encontrados = {}
+    for registro in iterar_registros_do_fim(colecao):
+        if registro.get('id') in faltando:
+            encontrados[registro['id']] = registro
+            faltando.discard(registro['id'])
+            if not faltando:
+                break
+    return [encontrados[registro_id] for registro_id in ids if registro_id in encontrados]
+
+def migrar_timestamps() -> None:
+    """Grava o timestamp normalizado nos registros antigos que ainda não o têm"""
+    for colecao, campo in (('vendas', 'data'), ('movimentacoes', 'data'), ('pedidos', 'data'),
+                           ('pre_vendas', 'data_criacao'), ('users', 'data_criacao'),
+                           ('clientes', 'data_criacao')):
+        registros = carregar_dados(colecao)
+        faltando = [r for r in registros if 'timestamp' not in r]
+        for registro in faltando:
+            registro['timestamp'] = timestamp_do_registro(registro, campo)
+        if faltando:
+            salvar_dados(colecao, registros)
+            print(f"✅ Timestamps adicionados em {len(faltando)} registros de {colecao}")
+
+# ============= ÍNDICE DE PEDIDOS POR CLIENTE =============
+
+# cliente_id -> {pedido_id: pedido}; pedido_id -> cliente_id para remoções
+_indice_pedidos_cliente: Dict[str, Any] = {'carregado': False, 'clientes': {}, 'donos': {}}
+
+def _garantir_indice_pedidos_cliente() -> None:
+    with _trava_indices:
+        if _indice_pedidos_cliente['carregado']:
+            return
+        _indice_pedidos_cliente['carregado'] = True
+        for pedido in carregar_dados('pedidos'):
+            indexar_pedido_cliente(pedido)
+
+def indexar_pedido_cliente(pedido: Dict[str, Any]) -> None:
+    """Adiciona ou atualiza um pedido no histórico do seu cliente"""
+    _garantir_indice_pedidos_cliente()
+    desindexar_pedido_cliente(pedido['id'])
+    _indice_pedidos_cliente['clientes'].setdefault(pedido.get('cliente_id'), {})[pedido['id']] = pedido
+    _indice_pedidos_cliente['donos'][pedido['id']] = pedido.get('cliente_id')
+
+def desindexar_pedido_cliente(pedido_id: int) -> None:
+    """Remove um pedido do histórico do seu cliente"""
+    if pedido_id not in _indice_pedidos_cliente['donos']:
+        return
+    cliente_id = _indice_pedidos_cliente['donos'].pop(pedido_id)
+    _indice_pedidos_cliente['clientes'].get(cliente_id, {}).pop(pedido_id, None)
+
+def pedidos_do_cliente(cliente_id: int) -> List[Dict[str, Any]]:
+    """Pedidos do cliente, mais recentes primeiro, sem varrer todos os pedidos"""
+    _garantir_indice_pedidos_cliente()
+    pedidos = _indice_pedidos_cliente['clientes'].get(cliente_id, {}).values()
+    return sorted(pedidos, key=timestamp_do_registro, reverse=True)
+
+# ============= FILA DE ATENDIMENTO DA PRÉ-VENDA =============
+
+# status -> {pedido_id: pedido} (na ordem de chegada ao status) e contadores mantidos a cada alteração
+_fila_pre_venda: Dict[str, Any] = {
+    'carregado': False,
+    'filas': {status: {} for status in STATUS_FILA_PRE_VENDA},
+    'status_do_pedido': {},
+    'contadores': {'total': 0, 'valor': 0.0, 'entregues': 0, 'pagos': 0}
+}
+
+def _status_fila(pedido: Dict[str, Any]) -> str:
+    status = pedido.get('status') if isinstance(pedido.get('status'), dict) else {}
+    if not status.get('pago', False):
+        return 'pendente_pagamento'
+    if not status.get('entregue', False):
+        return 'pendente_entrega'
+    return 'completo'
+
+def _garantir_fila_pre_venda() -> None:
+    with _trava_indices:
+        if _fila_pre_venda['carregado']:
+            return
+        _fila_pre_venda['carregado'] = True
+        for pedido in carregar_dados('pedidos'):
+            indexar_fila_pedido(pedido)
+
+def _contabilizar_pedido_fila(pedido: Dict[str, Any], sinal: int) -> None:
+    status = pedido.get('status') if isinstance(pedido.get('status'), dict) else {}
+    contadores = _fila_pre_venda['contadores']
+    contadores['total'] += sinal
+    contadores['valor'] += sinal * pedido.get('total', 0)
+    contadores['entregues'] += sinal * int(bool(status.get('entregue', False)))
+    contadores['pagos'] += sinal * int(bool(status.get('pago', False)))
+
+def indexar_fila_pedido(pedido: Dict[str, Any]) -> None:
+    """Coloca (ou move) um pedido de pré-venda na fila do seu status"""
+    _garantir_fila_pre_venda()
+    desindexar_fila_pedido(pedido['id'])
+    if pedido.get('tipo_pedido') != 'pre_venda':
+        return
+    status = _status_fila(pedido)
+    _fila_pre_venda['filas'][status][pedido['id']] = pedido
+    _fila_pre_venda['status_do_pedido'][pedido['id']] = status
+    _contabilizar_pedido_fila(pedido, 1)
+
+def desindexar_fila_pedido(pedido_id: int) -> None:
+    """Retira um pedido das filas de atendimento"""
+    status = _fila_pre_venda['status_do_pedido'].pop(pedido_id, None)
+    if status is None:
+        return
+    pedido = _fila_pre_venda['filas'][status].pop(pedido_id)
+    _contabilizar_pedido_fila(pedido, -1)
+
+def contadores_pre_venda() -> Dict[str, Any]:
+    """Totais dos pedidos de pré-venda, sem percorrer os pedidos"""
+    _garantir_fila_pre_venda()
+    contadores = dict(_fila_pre_venda['contadores'])
+    contadores['completos'] = len(_fila_pre_venda['filas']['completo'])
+    for status, fila in _fila_pre_venda['filas'].items():
+        contadores[status] = len(fila)
+    return contadores
+
+def pagina_fila_pre_venda(status: str, pagina: int) -> List[Dict[str, Any]]:
+    """Uma página da fila de um status, na ordem de chegada"""
+    _garantir_fila_pre_venda()
+    fila = _fila_pre_venda['filas'][status]
+    inicio = (pagina - 1) * PEDIDOS_POR_PAGINA
+    return list(itertools.islice(fila.values(), inicio, inicio + PEDIDOS_POR_PAGINA))
+
+# ============= PLANO DE PRODUÇÃO DA PRÉ-VENDA =============
+
+# pre_venda_id -> dia de retirada -> produto_id -> {nome, quantidade}; pedidos somados guardados para subtrair
+_plano_producao: Dict[str, Any] = {'carregado': False, 'planos': {}, 'pedidos': {}}
+
+def _garantir_plano_producao() -> None:
+    with _trava_indices:
+        if _plano_producao['carregado']:
+            return
+        _plano_producao['carregado'] = True
+        for pedido in carregar_dados('pedidos'):
+            indexar_plano_pedido(pedido)
+
+def _somar_plano(pedido: Dict[str, Any], sinal: int) -> None:
+    dias = _plano_producao['planos'].setdefault(pedido['pre_venda_id'], {})
+    dia = dias.setdefault(pedido.get('data_retirada') or 'Sem data', {})
+    for item in pedido.get('produtos', []):
+        linha = dia.setdefault(item['id'], {'nome': item.get('nome', ''), 'quantidade': 0})
+        linha['quantidade'] += sinal * item.get('quantidade', 0)
+        if linha['quantidade'] <= 0:
+            del dia[item['id']]
+    if not dia:
+        del dias[pedido.get('data_retirada') or 'Sem data']
+
+def indexar_plano_pedido(pedido: Dict[str, Any]) -> None:
+    """Soma os produtos de um pedido de pré-venda ao plano da sua campanha"""
+    _garantir_plano_producao()
+    desindexar_plano_pedido(pedido['id'])
+    if pedido.get('tipo_pedido') != 'pre_venda' or pedido.get('pre_venda_id') is None:
+        return
+    _plano_producao['pedidos'][pedido['id']] = pedido
+    _somar_plano(pedido, 1)
+
+def desindexar_plano_pedido(pedido_id: int) -> None:
+    """Subtrai do plano de produção os produtos de um pedido"""
+    pedido = _plano_producao['pedidos'].pop(pedido_id, None)
+    if pedido is not None:
+        _somar_plano(pedido, -1)
+
+def plano_producao(pre_venda_id: int) -> List[Dict[str, Any]]:
+    """Quantidades a produzir por dia de retirada, sem percorrer os pedidos"""
+    _garantir_plano_producao()
+    dias = _plano_producao['planos'].get(pre_venda_id, {})
+    return [{
+        'dia': dia,
+        'produtos': sorted(({'produto_id': produto_id, **linha} for produto_id, linha in dias[dia].items()),
+                           key=lambda linha: linha['nome'])
+    } for dia in sorted(dias, key=lambda dia: converter_data(dia) or float('inf'))]
+
+def indexar_pedido(pedido: Dict[str, Any]) -> None:
+    """Atualiza todos os índices de pedidos (cliente, fila de atendimento e plano de produção)"""
+    indexar_pedido_cliente(pedido)
+    indexar_fila_pedido(pedido)
+    indexar_plano_pedido(pedido)
+
+def desindexar_pedido(pedido_id: int) -> None:
+    """Remove o pedido de todos os índices de pedidos"""
+    desindexar_pedido_cliente(pedido_id)
+    desindexar_fila_pedido(pedido_id)
+    desindexar_plano_pedido(pedido_id)
+
+# ============= PREVISÃO DE DEMANDA =============
+
+# Matriz produtos x dias com as saídas; só as movimentações novas são somadas a cada atualização
+_demanda: Dict[str, Any] = {'processadas': 0, 'linhas': {}, 'dia_inicial': None, 'matriz': None, 'cache': {}}
+
+def _reiniciar_demanda() -> None:
+    _demanda.update({'processadas': 0, 'linhas': {}, 'dia_inicial': None, 'matriz': None, 'cache': {}})
+
+def atualizar_demanda() -> None:
+    """Acrescenta à matriz de demanda as saídas registradas desde a última atualização"""
+    with _trava_indices:
+        movimentacoes = carregar_dados('movimentacoes')
+        if len(movimentacoes) < _demanda['processadas']:
+            _reiniciar_demanda()
+
+        if len(movimentacoes) != _demanda['processadas']:
+            # Qualquer movimentação muda o estoque e, portanto, as sugestões
+            _demanda['cache'] = {}
+        # Datas legadas ilegíveis ficam com timestamp 0.0 (1970) e esticariam a matriz por décadas
+        novas = [m for m in movimentacoes[_demanda['processadas']:] if m.get('tipo') == 'saída' and timestamp_do_registro(m) > 0]
+        _demanda['processadas'] = len(movimentacoes)
+        if not novas:
+            return
+
+        dias = np.array([datetime.fromtimestamp(timestamp_do_registro(m)).toordinal() for m in novas])
+        if _demanda['dia_inicial'] is None:
+            _demanda['dia_inicial'] = int(dias.min())
+            _demanda['matriz'] = np.zeros((0, 1))
+        for m in novas:
+            if m['produto_id'] not in _demanda['linhas']:
+                _demanda['linhas'][m['produto_id']] = len(_demanda['linhas'])
+
+        # Expandir a matriz para novos produtos e dias (inclusive antes do primeiro dia, se houver atraso)
+        matriz = _demanda['matriz']
+        deslocamento = max(_demanda['dia_inicial'] - int(dias.min()), 0)
+        _demanda['dia_inicial'] -= deslocamento
+        colunas = max(matriz.shape[1] + deslocamento, int(dias.max()) - _demanda['dia_inicial'] + 1)
+        expandida = np.zeros((len(_demanda['linhas']), colunas))
+        expandida[:matriz.shape[0], deslocamento:deslocamento + matriz.shape[1]] = matriz
+
+        linhas = np.array([_demanda['linhas'][m['produto_id']] for m in novas])
+        quantidades = np.array([m.get('quantidade', 0) for m in novas], dtype=float)
+        np.add.at(expandida, (linhas, dias - _demanda['dia_inicial']), quantidades)
+        _demanda['matriz'] = expandida
+
+def prever_demanda(janela: int = 7, alpha: float = 0.3, dias_cobertura: int = 2) -> List[Dict[str, Any]]:
+    """Média móvel e suavização exponencial para todos os produtos de uma vez.
+
+    A trava cobre a atualização e o cálculo: duas requisições simultâneas somariam as mesmas saídas.
+    """
+    with _trava_indices:
+        atualizar_demanda()
+        chave_cache = (janela, alpha, dias_cobertura, datetime.now().toordinal())
+        if chave_cache in _demanda['cache']:
+            return _demanda['cache'][chave_cache]
+        if _demanda['matriz'] is None:
+            return []
+        produtos = carregar_dados('produtos')
+
+        # Completar com dias sem venda até hoje (o dia atual, incompleto, fica de fora)
+        hoje = datetime.now().toordinal()
+        matriz = _demanda['matriz']
+        faltando = hoje - _demanda['dia_inicial'] - matriz.shape[1]
+        if faltando > 0:
+            matriz = np.hstack([matriz, np.zeros((matriz.shape[0], faltando))])
+        matriz = matriz[:, :max(hoje - _demanda['dia_inicial'], 1)]
+
+        media_movel = matriz[:, -janela:].sum(axis=1) / janela
+
+        # Suavização exponencial em forma fechada: pesos alpha*(1-alpha)^k do dia mais recente para trás
+        pesos = alpha * (1 - alpha) ** np.arange(matriz.shape[1])[::-1]
+        pesos[0] += (1 - alpha) ** matriz.shape[1]  # o primeiro dia serve de valor inicial
+        suavizada = matriz @ pesos
+
+        previsao = np.maximum(media_movel, suavizada)
+        por_id = {p['id']: p for p in produtos}
+        sugestoes = []
+        for produto_id, linha in _demanda['linhas'].items():
+            produto = por_id.get(produto_id)
+            if not produto:
+                continue
+            diaria = float(previsao[linha])
+            necessidade = diaria * dias_cobertura + produto.get('estoque_minimo', 0)
+            sugestoes.append({
+                'produto_id': produto_id,
+                'nome': produto['nome'],
+                'estoque_atual': produto['quantidade'],
+                'media_movel': round(float(media_movel[linha]), 2),
+                'suavizacao_exponencial': round(float(suavizada[linha]), 2),
+                'producao_sugerida': int(np.ceil(diaria)),
+                'reposicao_sugerida': max(int(np.ceil(necessidade - produto['quantidade'])), 0)
+            })
+
+        sugestoes.sort(key=lambda s: s['reposicao_sugerida'], reverse=True)
+        _demanda['cache'][chave_cache] = sugestoes
+        return sugestoes
+
+@app.route('/api/previsao_demanda')
+@login_required
+@permission_required('visualizar_estoque')
+def api_previsao_demanda():
+    if np is None:
+        return jsonify({'success': False, 'message': 'Previsão indisponível: instale o numpy.'}), 503
+
+    janela = min(max(request.args.get('janela', 7, type=int), 1), 90)
+    alpha = min(max(request.args.get('alpha', 0.3, type=float), 0.01), 1.0)
+    dias_cobertura = min(max(request.args.get('dias_cobertura', 2, type=int), 0), 30)
+    return jsonify({
+        'success': True,
+        'janela': janela,
+        'alpha': alpha,
+        'dias_cobertura': dias_cobertura,
+        'produtos': prever_demanda(janela, alpha, dias_cobertura)
+    })
+
+# ============= CHECKPOINTS E AUDITORIA DE ESTOQUE =============
+
+def criar_checkpoint_estoque() -> Dict[str, Any]:
+    """Grava uma fotografia do estoque atual para acelerar reconstruções"""
+    produtos = carregar_dados('produtos')
+    checkpoints = carregar_dados('checkpoints_estoque')
+    checkpoint = {
+        'id': proximo_id('checkpoints_estoque'),
+        'data': datetime.now().strftime('%d/%m/%Y %H:%M:%S'),
+        'timestamp': datetime.now().timestamp(),
+        'estoque': {str(p['id']): p['quantidade'] for p in produtos},
+        'nomes': {str(p['id']): p['nome'] for p in produtos},
+        # Tudo o que foi gravado até aqui (inclusive com data retroativa) já está no estoque acima
+        'ultima_movimentacao_id': next(iterar_registros_do_fim('movimentacoes'), {}).get('id', 0)
+    }
+    checkpoints.append(checkpoint)
+    salvar_dados('checkpoints_estoque', checkpoints)
+    return checkpoint
+
+def criar_checkpoint_se_necessario() -> None:
+    """Cria um checkpoint se o último tiver mais de INTERVALO_CHECKPOINT_HORAS"""
+    checkpoints = carregar_dados('checkpoints_estoque')
+    limite = datetime.now().timestamp() - INTERVALO_CHECKPOINT_HORAS * 3600
+    if not checkpoints or checkpoints[-1]['timestamp'] < limite:
+        criar_checkpoint_estoque()
+
+def _movimentacoes_apos_checkpoint(checkpoint: Dict[str, Any], momento: float) -> List[Dict[str, Any]]:
+    # Gravadas depois do checkpoint (id maior, lidas do fim do arquivo) e com data até o momento,
+    # em ordem de gravação; inclui lançamentos retroativos feitos depois do checkpoint
+    novas = []
+    for mov in iterar_registros_do_fim('movimentacoes'):
+        if isinstance(mov.get('id'), int) and mov['id'] <= checkpoint['ultima_movimentacao_id']:
+            break
+        if timestamp_do_registro(mov) <= momento:
+            novas.append(mov)
+    novas.reverse()
+    return novas
+
+def reconstruir_estoque(momento: float) -> Dict[str, Any]:
+    """Estoque no instante pedido: parte do checkpoint anterior mais próximo e aplica só as movimentações seguintes"""
+    checkpoints = carregar_dados('checkpoints_estoque')
+    posicao = bisect.bisect_right([c['timestamp'] for c in checkpoints], momento)
+    if posicao:
+        checkpoint = checkpoints[posicao - 1]
+        estoque = {int(k): v for k, v in checkpoint['estoque'].items()}
+        nomes = {int(k): v for k, v in checkpoint.get('nomes', {}).items()}
+        inicio = checkpoint['timestamp']
+    else:
+        checkpoint = None
+        estoque, nomes, inicio = {}, {}, float('-inf')
+
+    if checkpoint and 'ultima_movimentacao_id' in checkpoint:
+        movimentacoes = _movimentacoes_apos_checkpoint(checkpoint, momento)
+    else:
+        # Sem checkpoint (ou checkpoint antigo, sem a última movimentação): pela data de cada uma
+        movimentacoes = [m for m in registros_no_periodo('movimentacoes', inicio, momento) if timestamp_do_registro(m) > inicio]
+    for mov in movimentacoes:
+        produto_id = mov['produto_id']
+        nomes[produto_id] = mov.get('produto_nome', nomes.get(produto_id, ''))
+        if mov['tipo'] == 'entrada_inicial':
+            estoque[produto_id] = mov['quantidade']
+        elif mov['tipo'] == 'entrada':
+            estoque[produto_id] = estoque.get(produto_id, 0) + mov['quantidade']
+        elif mov['tipo'] == 'saída':
+            estoque[produto_id] = estoque.get(produto_id, 0) - mov['quantidade']
+        elif mov['tipo'] == 'exclusao':
+            estoque.pop(produto_id, None)
+
+    return {
+        'checkpoint': checkpoint['data'] if checkpoint else None,
+        'movimentacoes_aplicadas': len(movimentacoes),
+        'estoque': estoque,
+        'nomes': nomes
+    }
+
+def auditar_estoque() -> List[Dict[str, Any]]:
+    """Compara o estoque reconstruído agora com o estoque gravado nos produtos"""
+    reconstruido = reconstruir_estoque(datetime.now().timestamp())
+    produtos = {p['id']: p for p in carregar_dados('produtos')}
+    divergencias = []
+    for produto_id in sorted(set(produtos) | set(reconstruido['estoque'])):
+        esperado = reconstruido['estoque'].get(produto_id)
+        atual = produtos[produto_id]['quantidade'] if produto_id in produtos else None
+        if esperado != atual:
+            divergencias.append({
+                'produto_id': produto_id,
+                'nome': produtos[produto_id]['nome'] if produto_id in produtos else reconstruido['nomes'].get(produto_id, ''),
+                'reconstruido': esperado,
+                'atual': atual,
+                'diferenca': (atual or 0) - (esperado or 0)
+            })
+    return divergencias
+
+@app.route('/auditoria_estoque')
+@login_required
+@permission_required('visualizar_estoque')
+def auditoria_estoque():
+    data = request.args.get('data', '')
+    hora = request.args.get('hora', '') or '23:59'
+    momento = converter_data(f"{data} {hora}") if data else None
+    if momento is None:
+        momento = datetime.now().timestamp()
+    else:
+        momento += 59  # até o fim do minuto informado
+
+    reconstruido = reconstruir_estoque(momento)
+    estoque_no_momento = [{'produto_id': produto_id, 'nome': reconstruido['nomes'].get(produto_id, ''), 'quantidade': quantidade}
+                          for produto_id, quantidade in sorted(reconstruido['estoque'].items())]
+
+    return render_template('auditoria_estoque.html',
+                         data=data,
+                         hora=hora,
+                         momento=datetime.fromtimestamp(momento).strftime('%d/%m/%Y %H:%M'),
+                         checkpoint=reconstruido['checkpoint'],
+                         movimentacoes_aplicadas=reconstruido['movimentacoes_aplicadas'],
+                         estoque_no_momento=estoque_no_momento,
+                         divergencias=auditar_estoque())
+
+@app.route('/checkpoint_estoque', methods=['POST'])
+@login_required
+@permission_required('alterar_estoque')
+def checkpoint_estoque():
+    checkpoint = criar_checkpoint_estoque()
+    flash(f"Checkpoint de estoque criado em {checkpoint['data']}.", 'success')
+    return redirect(url_for('auditoria_estoque'))
+
+@app.cli.command('checkpoint-estoque')
+def checkpoint_estoque_command():
+    """Cria um checkpoint do estoque (agendar no fechamento da loja)"""
+    checkpoint = criar_checkpoint_estoque()
+    print(f"✅ Checkpoint #{checkpoint['id']} criado com {len(checkpoint['estoque'])} produtos")
+
+# ============= RESUMO DIÁRIO DE VENDAS =============
+
+def _dia_da_venda(venda: Dict[str, Any]) -> str:
+    """Retorna o dia da venda no formato ISO (AAAA-MM-DD), ordenável como texto"""
+    timestamp = timestamp_do_registro(venda) or datetime.now().timestamp()
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d')
+
+def _acumular_venda_no_resumo(resumos: List[Dict[str, Any]], venda: Dict[str, Any]) -> None:
+    """Soma uma venda na linha do seu dia, criando a linha se necessário"""
+    dia = _dia_da_venda(venda)
+    linha = next((r for r in reversed(resumos) if r['dia'] == dia), None)
+    if not linha:
+        linha = {
+            'dia': dia,
+            'data': datetime.strptime(dia, '%Y-%m-%d').strftime('%d/%m/%Y'),
+            'receita': 0.0,
+            'quantidade_vendas': 0,
+            'receita_online': 0.0,
+            'vendas_online': 0,
+            'receita_balcao': 0.0,
+            'vendas_balcao': 0,
+            'itens': {}
+        }
+        resumos.append(linha)
+        resumos.sort(key=lambda r: r['dia'])
+
+    total = float(venda.get('total', 0))
+    canal = 'online' if venda.get('tipo') == 'online' else 'balcao'
+    linha['receita'] += total
+    linha['quantidade_vendas'] += 1
+    linha[f'receita_{canal}'] += total
+    linha[f'vendas_{canal}'] += 1
+
+    for produto in venda.get('produtos', []):
+        chave = str(produto.get('id'))
+        item = linha['itens'].setdefault(chave, {'nome': produto.get('nome', ''), 'quantidade': 0, 'receita': 0.0})
+        item['quantidade'] += produto.get('quantidade', 0)
+        item['receita'] += produto.get('preco', 0) * produto.get('quantidade', 0)
+
+def atualizar_resumo_diario(venda: Dict[str, Any]) -> None:
+    """Atualiza o resumo materializado com uma nova venda"""
+    resumos = carregar_dados('resumo_vendas_diario')
+    _acumular_venda_no_resumo(resumos, venda)
+    salvar_dados('resumo_vendas_diario', resumos)
+
+def reconstruir_resumo_diario() -> List[Dict[str, Any]]:
+    """Recalcula todo o resumo diário a partir do histórico de vendas"""
+    resumos: List[Dict[str, Any]] = []
+    for venda in carregar_dados('vendas'):
+        _acumular_venda_no_resumo(resumos, venda)
+    salvar_dados('resumo_vendas_diario', resumos)
+    return resumos
+
+def carregar_resumo_periodo(inicio: str = '', fim: str = '') -> List[Dict[str, Any]]:
+    """Carrega as linhas do resumo entre duas datas ISO (inclusive)"""
+    resumos = carregar_dados('resumo_vendas_diario')
+    return [r for r in resumos if (not inicio or r['dia'] >= inicio) and (not fim or r['dia'] <= fim)]
+
+@app.cli.command('reconstruir-resumos')
+def reconstruir_resumos_command():
+    """Reconstrói o resumo diário de vendas a partir do histórico"""
+    resumos = reconstruir_resumo_diario()
+    print(f"✅ Resumo diário reconstruído: {len(resumos)} dias")
+
+# ============= REGISTROS COMPACTOS =============
+
+class RegistroCompacto:
+    """Registro de histórico com __slots__ e textos repetidos internados.
+
+    Aceita o mesmo acesso de um dict (registro['id'], registro.get(...), 'campo' in registro),
+    então pode ser passado direto aos templates. Campos fora de CAMPOS vão para _extras.
+    """
+    __slots__ = ('_extras',)
+    CAMPOS: tuple = ()
+    INTERNADOS: frozenset = frozenset()
+
+    def __init__(self, dados: Dict[str, Any]):
+        extras = None
+        for chave, valor in dados.items():
+            if chave in self.CAMPOS:
+                if chave in self.INTERNADOS and isinstance(valor, str):
+                    valor = sys.intern(valor)
+                setattr(self, chave, valor)
+            else:
+                extras = extras or {}
+                extras[chave] = valor
+        self._extras = extras
+
+    def __getitem__(self, chave: str) -> Any:
+        if chave in self.CAMPOS:
+            try:
+                return getattr(self, chave)
+            except AttributeError:
+                raise KeyError(chave)
+        if self._extras and chave in self._extras:
+            return self._extras[chave]
+        raise KeyError(chave)
+
+    def __contains__(self, chave: str) -> bool:
+        try:
+            self[chave]
+            return True
+        except KeyError:
+            return False
+
+    def get(self, chave: str, padrao: Any = None) -> Any:
+        try:
+            return self[chave]
+        except KeyError:
+            return padrao
+
+    def keys(self) -> List[str]:
+        return [c for c in self.CAMPOS if hasattr(self, c)] + list(self._extras or {})
+
+    def items(self) -> List[Any]:
+        return [(chave, self[chave]) for chave in self.keys()]
+
+    def como_dict(self) -> Dict[str, Any]:
+        return dict(self.items())
+
+class ItemVendido(RegistroCompacto):
+    __slots__ = ('id', 'nome', 'preco', 'quantidade')
+    CAMPOS = __slots__
+    INTERNADOS = frozenset({'nome'})
+
+class Movimentacao(RegistroCompacto):
+    __slots__ = ('id', 'produto_id', 'produto_nome', 'quantidade', 'tipo', 'usuario', 'data', 'timestamp',
+                 'observacao', 'recebimento_id')
+    CAMPOS = __slots__
+    INTERNADOS = frozenset({'produto_nome', 'tipo', 'usuario', 'observacao'})
+
+class Venda(RegistroCompacto):
+    __slots__ = ('id', 'data', 'timestamp', 'produtos', 'total', 'vendedor', 'cpf_cliente', 'cliente_id',
+                 'cliente_nome', 'tipo')
+    CAMPOS = __slots__
+    INTERNADOS = frozenset({'vendedor', 'cliente_nome', 'tipo'})
+
+    def __init__(self, dados: Dict[str, Any]):
+        super().__init__(dados)
+        if hasattr(self, 'produtos'):
+            self.produtos = [ItemVendido(p) for p in self.produtos]
+
+class Pedido(RegistroCompacto):
+    __slots__ = ('id', 'cliente_id', 'cliente_nome', 'produtos', 'metodo_pagamento', 'tipo_pedido', 'total',
+                 'status', 'data', 'timestamp', 'desconto_aplicado', 'data_entrega', 'data_pagamento',
+                 'pre_venda_id', 'data_retirada')
+    CAMPOS = __slots__
+    INTERNADOS = frozenset({'cliente_nome', 'metodo_pagamento', 'tipo_pedido'})
+
+    def __init__(self, dados: Dict[str, Any]):
+        super().__init__(dados)
+        if hasattr(self, 'produtos'):
+            self.produtos = [ItemVendido(p) for p in self.produtos]
+
+CLASSES_COMPACTAS = {'vendas': Venda, 'movimentacoes': Movimentacao, 'pedidos': Pedido}
+
+def compactar_registros(colecao: str, registros: List[Dict[str, Any]]) -> List[RegistroCompacto]:
+    """Converte registros de histórico (somente leitura) para a forma compacta"""
+    classe = CLASSES_COMPACTAS[colecao]
+    return [classe(r) for r in registros]
+
+def carregar_registros(colecao: str) -> List[RegistroCompacto]:
+    """Carrega uma coleção de histórico já compactada, para exibição.
+
+    Cada registro é compactado assim que sai do arquivo, então a coleção nunca existe
+    ao mesmo tempo como dicts e como registros compactos.
+    """
+    classe = CLASSES_COMPACTAS[colecao]
+    if ESCRITA_ADIADA and colecao in COLECOES_ADIADAS:
+        # Os dicts já estão no cache da escrita adiada: compacta direto dele, sem a cópia de carregar_dados
+        with _trava_colecoes:
+            if colecao not in _colecoes_em_memoria:
+                _colecoes_em_memoria[colecao] = _ler_arquivo(colecao)
+            return [classe(r) for r in _colecoes_em_memoria[colecao]]
+    return [classe(r) for r in iterar_registros(colecao)]
+
+# ============= CONTAS: EQUIPE E CLIENTES =============
+
+# Por coleção ('users' = equipe, 'clientes'): registros por id, chaves de busca
+# ordenadas (palavras do nome, email, CPF) e emails/CPFs para checar duplicidade
+_indices_contas: Dict[str, Dict[str, Any]] = {}
+
+def _chaves_busca_conta(conta: Dict[str, Any]) -> List[str]:
+    chaves = normalizar_texto(conta.get('nome', '')).split()
+    chaves.append(conta.get('email', '').lower())
+    if conta.get('cpf'):
+        chaves.append(conta['cpf'])
+    return chaves
+
+def _garantir_indice_contas(colecao: str) -> Dict[str, Any]:
+    with _trava_indices:
+        if colecao not in _indices_contas:
+            contas = carregar_dados(colecao)
+            # Com ids repetidos vale o último registro, como em indexar_conta
+            registros = {conta['id']: conta for conta in contas}
+            indice = {'registros': registros, 'chaves': [], 'emails': {}, 'cpfs': {}}
+            for conta in contas:
+                if registros[conta['id']] is not conta:
+                    continue
+                indice['emails'][conta.get('email', '').lower()] = conta['id']
+                if conta.get('cpf'):
+                    indice['cpfs'][conta['cpf']] = conta['id']
+                indice['chaves'].extend((chave, conta['id']) for chave in _chaves_busca_conta(conta))
+            # Uma ordenação só na montagem; insort fica para as inclusões avulsas
+            indice['chaves'].sort()
+            _indices_contas[colecao] = indice
+        return _indices_contas[colecao]
+
+def indexar_conta(colecao: str, conta: Dict[str, Any]) -> None:
+    """Adiciona uma conta ao índice de busca da sua coleção"""
+    indice = _garantir_indice_contas(colecao)
+    desindexar_conta(colecao, conta['id'])
+    indice['registros'][conta['id']] = conta
+    indice['emails'][conta.get('email', '').lower()] = conta['id']
+    if conta.get('cpf'):
+        indice['cpfs'][conta['cpf']] = conta['id']
+    for chave in _chaves_busca_conta(conta):
+        bisect.insort(indice['chaves'], (chave, conta['id']))
+
+def desindexar_conta(colecao: str, conta_id: int) -> None:
+    """Remove uma conta do índice de busca da sua coleção"""
+    indice = _indices_contas.get(colecao)
+    conta = indice['registros'].pop(conta_id, None) if indice else None
+    if not conta:
+        return
+    indice['emails'].pop(conta.get('email', '').lower(), None)
+    indice['cpfs'].pop(conta.get('cpf'), None)
+    for chave in _chaves_busca_conta(conta):
+        posicao = bisect.bisect_left(indice['chaves'], (chave, conta_id))
+        if posicao < len(indice['chaves']) and indice['chaves'][posicao] == (chave, conta_id):
+            del indice['chaves'][posicao]
+
+def _ids_com_prefixo(indice: Dict[str, Any], prefixo: str) -> set:
+    chaves = indice['chaves']
+    posicao = bisect.bisect_left(chaves, (prefixo,))
+    ids = set()
+    while posicao < len(chaves) and chaves[posicao][0].startswith(prefixo):
+        ids.add(chaves[posicao][1])
+        posicao += 1
+    return ids
+
+def buscar_contas(colecao: str, termo: str, pagina: int) -> Any:
+    """Uma página de contas que casam com o termo (nome, email ou CPF) e o total encontrado"""
+    indice = _garantir_indice_contas(colecao)
+    palavras = normalizar_texto(termo).replace('.', '').replace('-', '').split() if '@' not in termo else [termo.strip().lower()]
+    if palavras:
+        ids = set.intersection(*(_ids_com_prefixo(indice, p) for p in palavras))
+        encontrados = [indice['registros'][conta_id] for conta_id in sorted(ids)]
+    else:
+        encontrados = list(indice['registros'].values())
+    inicio = (pagina - 1) * USUARIOS_POR_PAGINA
+    return encontrados[inicio:inicio + USUARIOS_POR_PAGINA], len(encontrados)
+
+def email_cadastrado(email: str) -> bool:
+    """Email já usado por alguém da equipe ou por um cliente"""
+    return any(email.lower() in _garantir_indice_contas(c)['emails'] for c in ('users', 'clientes'))
+
+# ============= SENHAS =============
+
+def gerar_hash_senha(senha: str) -> str:
+    """Hash PBKDF2 no formato algoritmo$iteracoes$sal$hash"""
+    sal = os.urandom(16)
+    derivado = hashlib.pbkdf2_hmac('sha256', senha.encode(), sal, PBKDF2_ITERACOES)
+    return f"pbkdf2_sha256${PBKDF2_ITERACOES}${sal.hex()}${derivado.hex()}"
+
+def verificar_senha(senha: str, armazenada: str) -> bool:
+    """Confere a senha contra o hash PBKDF2 ou contra o SHA-256 legado"""
+    partes = armazenada.split('$')
+    if len(partes) == 4 and partes[0] == 'pbkdf2_sha256':
+        derivado = hashlib.pbkdf2_hmac('sha256', senha.encode(), bytes.fromhex(partes[2]), int(partes[1]))
+        return hmac.compare_digest(derivado.hex(), partes[3])
+    return hmac.compare_digest(hashlib.sha256(senha.encode()).hexdigest(), armazenada)
+
+def senha_desatualizada(armazenada: str) -> bool:
+    """Hash legado (SHA-256) ou com custo diferente do configurado"""
+    partes = armazenada.split('$')
+    return len(partes) != 4 or partes[0] != 'pbkdf2_sha256' or int(partes[1]) != PBKDF2_ITERACOES
+
+# Usado quando o email não existe, para o tempo de resposta não revelar quais emails são cadastrados
+_HASH_FICTICIO = f"pbkdf2_sha256${PBKDF2_ITERACOES}${'00' * 16}${'00' * 32}"
+
+def autenticar(email: str, senha: str) -> Any:
+    """Busca a conta pelo índice de emails e verifica só ela; atualiza hashes antigos"""
+    email = email.strip().lower()
+    for colecao in ('users', 'clientes'):
+        indice = _garantir_indice_contas(colecao)
+        if email in indice['emails']:
+            conta = indice['registros'][indice['emails'][email]]
+            break
+    else:
+        verificar_senha(senha, _HASH_FICTICIO)
+        return None
+
+    if not verificar_senha(senha, conta.get('senha', '')):
+        return None
+    if senha_desatualizada(conta['senha']):
+        contas = carregar_dados(colecao)
+        registro = next((c for c in contas if c['id'] == conta['id']), None)
+        if registro:
+            registro['senha'] = gerar_hash_senha(senha)
+            salvar_dados(colecao, contas)
+            indexar_conta(colecao, registro)
+            conta = registro
+    return conta
+
+def migrar_clientes() -> None:
+    """Move as contas de clientes de users.json para clientes.json"""
+    users = carregar_dados('users')
+    clientes_antigos = [u for u in users if u.get('tipo') == 'cliente']
+    if not clientes_antigos:
+        return
+    clientes = carregar_dados('clientes')
+    clientes.extend(clientes_antigos)
+    salvar_dados('clientes', clientes)
+    salvar_dados('users', [u for u in users if u.get('tipo') != 'cliente'])
+    for colecao in ('users', 'clientes'):
+        _indices_contas.pop(colecao, None)
+    print(f"✅ {len(clientes_antigos)} clientes movidos para clientes.json")
+
 # ============= ROTAS PRINCIPAIS =============
 
 @app.route('/')
@@ -142,11 +1470,7 @@ def index():
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
-        email = request.form['email']
-        senha = hashlib.sha256(request.form['senha'].encode()).hexdigest()
-
-        users = carregar_dados('users')
-        user = next((u for u in users if u['email'] == email and u['senha'] == senha), None)
+        user = autenticar(request.form['email'], request.form['senha'])
 
         if user:
             session['user_id'] = user['id']
@@ -172,21 +1496,20 @@ def cadastro_cliente():
         nome = request.form['nome']
         email = request.form['email']
         cpf = request.form['cpf'].replace('.', '').replace('-', '')
-        senha = hashlib.sha256(request.form['senha'].encode()).hexdigest()
+        senha = gerar_hash_senha(request.form['senha'])
         telefone = request.form['telefone']
 
-        users = carregar_dados('users')
-
-        if any(u['email'] == email for u in users):
+        if email_cadastrado(email):
             flash("Email já cadastrado", "error")
             return render_template('cadastro_cliente.html', nome=nome, email=email, cpf=cpf, telefone=telefone)
 
-        if any(u.get('cpf') == cpf for u in users):
+        if cpf in _garantir_indice_contas('clientes')['cpfs']:
             flash("CPF já cadastrado", "error")
             return render_template('cadastro_cliente.html', nome=nome, email=email, cpf=cpf, telefone=telefone)
 
+        clientes = carregar_dados('clientes')
         novo_cliente = {
-            'id': len(users) + 1,
+            'id': proximo_id('clientes'),
             'nome': nome,
             'email': email,
             'cpf': cpf,
@@ -195,11 +1518,13 @@ def cadastro_cliente():
             'tipo': 'cliente',
             'permissoes': ['fazer_pedidos'],
             'data_criacao': datetime.now().strftime('%d/%m/%Y %H:%M:%S'),
+            'timestamp': datetime.now().timestamp(),
             'pontos': 0
         }
 
-        users.append(novo_cliente)
-        salvar_dados('users', users)
+        clientes.append(novo_cliente)
+        salvar_dados('clientes', clientes)
+        indexar_conta('clientes', novo_cliente)
 
         flash('Cadastro realizado com sucesso! Faça login para continuar.', 'success')
         return redirect(url_for('login'))
@@ -220,20 +1545,21 @@ def dashboard():
         return redirect(url_for('pre_venda'))
     
     produtos = carregar_dados('produtos')
-    vendas = carregar_dados('vendas')
+    resumos = carregar_dados('resumo_vendas_diario')
     users = carregar_dados('users')
     pontos = carregar_dados('pontos')
     pedidos = carregar_dados('pedidos')
 
-    # Estatísticas
-    total_vendas = sum(venda['total'] for venda in vendas) if vendas else 0
+    # Estatísticas (a partir do resumo diário materializado)
+    total_vendas = sum(r['receita'] for r in resumos)
+    quantidade_vendas = sum(r['quantidade_vendas'] for r in resumos)
     total_produtos = len(produtos)
     total_usuarios = len(users)
     produtos_estoque_baixo = [p for p in produtos if p['quantidade'] < p.get('estoque_minimo', 0)]
 
     return render_template('dashboard.html',
                          produtos=produtos,
-                         vendas=vendas,
+                         quantidade_vendas=quantidade_vendas,
                          users=users,
                          pontos=pontos,
                          pedidos=pedidos,
@@ -247,8 +1573,43 @@ def dashboard():
 @login_required
 @permission_required('gerenciar_usuarios')
 def gerenciar_usuarios():
-    users = carregar_dados('users')
-    return render_template('gerenciar_usuarios.html', users=users)
+    busca = request.args.get('q', '')
+    pagina = max(request.args.get('pagina', 1, type=int), 1)
+    users, total = buscar_contas('users', busca, pagina)
+    return render_template('gerenciar_usuarios.html',
+                         users=users,
+                         busca=busca,
+                         pagina=pagina,
+                         total_paginas=max((total + USUARIOS_POR_PAGINA - 1) // USUARIOS_POR_PAGINA, 1))
+
+@app.route('/gerenciar_clientes')
+@login_required
+@permission_required('gerenciar_usuarios')
+def gerenciar_clientes():
+    busca = request.args.get('q', '')
+    pagina = max(request.args.get('pagina', 1, type=int), 1)
+    clientes, total = buscar_contas('clientes', busca, pagina)
+    return render_template('gerenciar_clientes.html',
+                         clientes=clientes,
+                         total=total,
+                         busca=busca,
+                         pagina=pagina,
+                         total_paginas=max((total + USUARIOS_POR_PAGINA - 1) // USUARIOS_POR_PAGINA, 1))
+
+@app.route('/excluir_cliente/<int:cliente_id>')
+@login_required
+@permission_required('gerenciar_usuarios')
+def excluir_cliente(cliente_id):
+    clientes = carregar_dados('clientes')
+    cliente_removido = next((c for c in clientes if c['id'] == cliente_id), None)
+    if cliente_removido:
+        salvar_dados('clientes', [c for c in clientes if c['id'] != cliente_id])
+        desindexar_conta('clientes', cliente_id)
+        flash(f"Cliente '{cliente_removido['nome']}' excluído com sucesso!", "success")
+    else:
+        flash("Cliente não encontrado.", "error")
+
+    return redirect(url_for('gerenciar_clientes'))
 
 @app.route('/adicionar_usuario', methods=['POST'])
 @login_required
@@ -256,7 +1617,7 @@ def gerenciar_usuarios():
 def adicionar_usuario():
     nome = request.form['nome']
     email = request.form['email']
-    senha = hashlib.sha256(request.form['senha'].encode()).hexdigest()
+    senha = gerar_hash_senha(request.form['senha'])
     tipo = request.form['tipo']
 
     permissoes_map = {
@@ -268,24 +1629,28 @@ def adicionar_usuario():
         'admin': ['gerenciar_usuarios', 'visualizar_estoque', 'alterar_estoque', 'realizar_vendas', 'cadastrar_produtos', 'visualizar_relatorios', 'gerenciar_pre_vendas']
     }
 
-    users = carregar_dados('users')
-
-    if any(u['email'] == email for u in users):
+    if email_cadastrado(email):
         flash("Email já cadastrado", "error")
         return redirect(url_for('gerenciar_usuarios'))
 
+    # Contas de cliente ficam fora da coleção da equipe
+    colecao = 'clientes' if tipo == 'cliente' else 'users'
+    users = carregar_dados(colecao)
+
     novo_user = {
-        'id': len(users) + 1,
+        'id': proximo_id(colecao),
         'nome': nome,
         'email': email,
         'senha': senha,
         'tipo': tipo,
         'permissoes': permissoes_map.get(tipo, []),
-        'data_criacao': datetime.now().strftime('%d/%m/%Y %H:%M:%S')
+        'data_criacao': datetime.now().strftime('%d/%m/%Y %H:%M:%S'),
+        'timestamp': datetime.now().timestamp()
     }
 
     users.append(novo_user)
-    salvar_dados('users', users)
+    salvar_dados(colecao, users)
+    indexar_conta(colecao, novo_user)
     flash(f"Usuário '{nome}' adicionado com sucesso!", "success")
     return redirect(url_for('gerenciar_usuarios'))
 
@@ -313,6 +1678,7 @@ def excluir_usuario(user_id):
     if user_removido:
         users = [u for u in users if u['id'] != user_id]
         salvar_dados('users', users)
+        desindexar_conta('users', user_id)
         flash(f"Usuário '{user_removido['nome']}' excluído com sucesso!", "success")
     else:
         flash("Usuário não encontrado.", "error")
@@ -340,6 +1706,12 @@ def aumentar_estoque():
         flash("Dados inválidos para aumentar estoque.", "error")
         return redirect(url_for('estoque'))
 
+    timestamp_movimentacao = timestamp_de_data_informada(data_movimentacao)
+    if timestamp_movimentacao > datetime.now().timestamp():
+        # Uma entrada com data futura já estaria nos checkpoints antes de valer
+        flash("A data da entrada não pode estar no futuro.", "error")
+        return redirect(url_for('estoque'))
+
     produtos = carregar_dados('produtos')
     movimentacoes = carregar_dados('movimentacoes')
 
@@ -351,13 +1723,14 @@ def aumentar_estoque():
 
             # Registrar movimentação
             movimentacoes.append({
-                'id': len(movimentacoes) + 1,
+                'id': proximo_id('movimentacoes'),
                 'produto_id': produto_id,
                 'produto_nome': produto['nome'],
                 'quantidade': quantidade_adicionar,
                 'tipo': 'entrada',
                 'usuario': session['user_nome'],
-                'data': data_movimentacao
+                'data': data_movimentacao,
+                'timestamp': timestamp_movimentacao
             })
             break
 
@@ -370,6 +1743,115 @@ def aumentar_estoque():
     
     return redirect(url_for('estoque'))
 
+@app.route('/recebimento_mercadorias', methods=['GET', 'POST'])
+@login_required
+@permission_required('alterar_estoque')
+def recebimento_mercadorias():
+    """Registra uma entrega inteira (várias linhas) com uma gravação por arquivo"""
+    if request.method == 'GET':
+        produtos = carregar_dados('produtos')
+        recebimentos = carregar_dados('recebimentos')
+        return render_template('recebimento_mercadorias.html', produtos=produtos, recebimentos=recebimentos[-20:][::-1])
+
+    erros = []
+    if request.is_json:
+        dados = request.get_json(silent=True)
+        if not isinstance(dados, dict):
+            dados = {}
+            erros.append("Corpo inválido: esperado um objeto com fornecedor, observacao e itens.")
+        linhas = dados.get('itens') or []
+        if not isinstance(linhas, list):
+            linhas = []
+            erros.append("Itens inválidos: esperada uma lista de produtos recebidos.")
+        fornecedor = str(dados.get('fornecedor') or '')
+        observacao = str(dados.get('observacao') or '')
+    else:
+        linhas = [{'produto_id': produto_id, 'quantidade': quantidade}
+                  for produto_id, quantidade in zip(request.form.getlist('produto_id'), request.form.getlist('quantidade'))]
+        fornecedor = request.form.get('fornecedor', '')
+        observacao = request.form.get('observacao', '')
+
+    produtos = carregar_dados('produtos')
+    por_id = {p['id']: p for p in produtos}
+
+    # Linhas repetidas do mesmo produto são somadas
+    quantidades: Dict[int, int] = {}
+    for numero, linha in enumerate(linhas, start=1):
+        if not isinstance(linha, dict):
+            erros.append(f"Linha {numero}: formato inválido, esperado um objeto com produto_id e quantidade.")
+            continue
+        try:
+            produto_id = int(linha.get('produto_id') or 0)
+            quantidade = int(linha.get('quantidade') or 0)
+        except (TypeError, ValueError):
+            erros.append(f"Linha {numero}: produto ou quantidade inválido.")
+            continue
+        if produto_id == 0 and quantidade == 0:
+            continue
+        if produto_id not in por_id:
+            erros.append(f"Linha {numero}: produto não encontrado.")
+        elif quantidade <= 0:
+            erros.append(f"Linha {numero}: quantidade deve ser positiva.")
+        else:
+            quantidades[produto_id] = quantidades.get(produto_id, 0) + quantidade
+
+    if not quantidades and not erros:
+        erros.append("Informe ao menos um produto recebido.")
+
+    if erros:
+        if request.is_json:
+            return jsonify({'success': False, 'message': 'Recebimento não registrado.', 'erros': erros}), 400
+        for erro in erros[:10]:
+            flash(erro, 'error')
+        return redirect(url_for('recebimento_mercadorias'))
+
+    movimentacoes = carregar_dados('movimentacoes')
+    recebimentos = carregar_dados('recebimentos')
+    data_recebimento = datetime.now().strftime('%d/%m/%Y %H:%M:%S')
+    timestamp_recebimento = datetime.now().timestamp()
+
+    novo_recebimento = {
+        'id': proximo_id('recebimentos'),
+        'fornecedor': fornecedor,
+        'observacao': observacao,
+        'usuario': session['user_nome'],
+        'data': data_recebimento,
+        'timestamp': timestamp_recebimento,
+        'itens': []
+    }
+
+    for produto_id, quantidade in quantidades.items():
+        produto = por_id[produto_id]
+        produto['quantidade'] += quantidade
+        novo_recebimento['itens'].append({
+            'produto_id': produto_id,
+            'produto_nome': produto['nome'],
+            'quantidade': quantidade
+        })
+        movimentacoes.append({
+            'id': proximo_id('movimentacoes'),
+            'produto_id': produto_id,
+            'produto_nome': produto['nome'],
+            'quantidade': quantidade,
+            'tipo': 'entrada',
+            'usuario': session['user_nome'],
+            'data': data_recebimento,
+            'timestamp': timestamp_recebimento,
+            'recebimento_id': novo_recebimento['id'],
+            'observacao': f"Recebimento #{novo_recebimento['id']}" + (f" - {fornecedor}" if fornecedor else '')
+        })
+
+    recebimentos.append(novo_recebimento)
+    salvar_dados('produtos', produtos)
+    salvar_dados('movimentacoes', movimentacoes)
+    salvar_dados('recebimentos', recebimentos)
+
+    mensagem = f"Recebimento #{novo_recebimento['id']} registrado: {len(quantidades)} produto(s) atualizados."
+    if request.is_json:
+        return jsonify({'success': True, 'message': mensagem, 'recebimento_id': novo_recebimento['id']})
+    flash(mensagem, 'success')
+    return redirect(url_for('estoque'))
+
 @app.route('/excluir_produto/<int:produto_id>')
 @login_required
 @permission_required('alterar_estoque')
@@ -381,19 +1863,21 @@ def excluir_produto(produto_id):
         # Registrar movimentação de exclusão
         movimentacoes = carregar_dados('movimentacoes')
         movimentacoes.append({
-            'id': len(movimentacoes) + 1,
+            'id': proximo_id('movimentacoes'),
             'produto_id': produto_id,
             'produto_nome': produto_removido['nome'],
             'quantidade': produto_removido['quantidade'],
             'tipo': 'exclusao',
             'usuario': session['user_nome'],
-            'data': datetime.now().strftime('%d/%m/%Y %H:%M:%S')
+            'data': datetime.now().strftime('%d/%m/%Y %H:%M:%S'),
+            'timestamp': datetime.now().timestamp()
         })
         salvar_dados('movimentacoes', movimentacoes)
         
         # Remover produto
         produtos = [p for p in produtos if p['id'] != produto_id]
         salvar_dados('produtos', produtos)
+        desindexar_produto(produto_id)
         
         flash(f"Produto '{produto_removido['nome']}' excluído com sucesso!", "success")
     else:
@@ -419,7 +1903,7 @@ def cadastro_produto():
             return render_template('cadastro_produto.html', nome=nome, preco=preco, quantidade=quantidade, categoria=categoria)
 
         novo_produto = {
-            'id': len(produtos) + 1,
+            'id': proximo_id('produtos'),
             'nome': nome,
             'preco': preco,
             'quantidade': quantidade,
@@ -429,16 +1913,18 @@ def cadastro_produto():
 
         produtos.append(novo_produto)
         salvar_dados('produtos', produtos)
+        indexar_produto(novo_produto)
 
         movimentacoes = carregar_dados('movimentacoes')
         movimentacoes.append({
-            'id': len(movimentacoes) + 1,
+            'id': proximo_id('movimentacoes'),
             'produto_id': novo_produto['id'],
             'produto_nome': novo_produto['nome'],
             'quantidade': quantidade,
             'tipo': 'entrada_inicial',
             'usuario': session['user_nome'],
-            'data': datetime.now().strftime('%d/%m/%Y %H:%M:%S')
+            'data': datetime.now().strftime('%d/%m/%Y %H:%M:%S'),
+            'timestamp': datetime.now().timestamp()
         })
         salvar_dados('movimentacoes', movimentacoes)
 
@@ -447,6 +1933,191 @@ def cadastro_produto():
 
     return render_template('cadastro_produto.html')
 
+# ============= IMPORTAÇÃO EM LOTE =============
+
+def _ler_linhas_lote() -> List[Dict[str, Any]]:
+    """Lê as linhas enviadas como JSON (lista ou {'produtos': [...]}) ou arquivo CSV"""
+    if request.is_json:
+        dados = request.get_json(silent=True)
+        if dados is None:
+            raise ValueError('JSON malformado')
+        return _linhas_do_json(dados)
+
+    arquivo = request.files.get('arquivo')
+    if not arquivo or not arquivo.filename:
+        return []
+    conteudo = arquivo.read().decode('utf-8-sig')
+    if arquivo.filename.lower().endswith('.json'):
+        return _linhas_do_json(json.loads(conteudo))
+
+    # Planilhas brasileiras costumam exportar com ';'
+    delimitador = ';' if conteudo.split('\n', 1)[0].count(';') > conteudo.split('\n', 1)[0].count(',') else ','
+    # Linha com mais colunas que o cabeçalho (sobra em linha[None]) vira None e é apontada como erro da linha
+    return [None if None in linha else {(k or '').strip().lower(): (v or '').strip() for k, v in linha.items()}
+            for linha in csv.DictReader(io.StringIO(conteudo), delimiter=delimitador)]
+
+def _linhas_do_json(dados: Any) -> List[Any]:
+    """Aceita uma lista de linhas ou um objeto {'produtos': [...]}"""
+    if isinstance(dados, dict):
+        dados = dados.get('produtos', [])
+    if not isinstance(dados, list):
+        raise ValueError('esperada uma lista de produtos')
+    return dados
+
+def _numero(valor: Any) -> float:
+    """Aceita números com vírgula decimal (ex.: '4,50'); recusa nan e infinito"""
+    if isinstance(valor, bool):
+        raise ValueError('valor lógico não é número')
+    numero = float(str(valor).replace(',', '.')) if isinstance(valor, str) else float(valor)
+    if not math.isfinite(numero):
+        raise ValueError('número não finito')
+    return numero
+
+def _inteiro(valor: Any) -> int:
+    """Como _numero, mas recusa casas decimais (ex.: '2,7' não vira 2)"""
+    numero = _numero(valor)
+    if not numero.is_integer():
+        raise ValueError('esperado número inteiro')
+    return int(numero)
+
+def _responder_lote(sucesso: bool, mensagem: str, erros: List[str]):
+    accepts = request.headers.get('Accept', '')
+    if request.is_json or 'application/json' in accepts:
+        return jsonify({'success': sucesso, 'message': mensagem, 'erros': erros}), (200 if sucesso else 400)
+
+    flash(mensagem, 'success' if sucesso else 'error')
+    for erro in erros[:10]:
+        flash(erro, 'error')
+    return redirect(url_for('estoque') if sucesso else url_for('cadastro_produto'))
+
+@app.route('/importar_produtos', methods=['POST'])
+@login_required
+@permission_required('cadastrar_produtos')
+def importar_produtos():
+    """Cadastra vários produtos de uma vez: tudo ou nada, com uma única gravação"""
+    try:
+        linhas = _ler_linhas_lote()
+    except (ValueError, UnicodeDecodeError) as e:
+        return _responder_lote(False, f'Arquivo inválido: {str(e)}', [])
+
+    if not linhas:
+        return _responder_lote(False, 'Nenhum produto para importar.', [])
+
+    produtos = carregar_dados('produtos')
+    nomes_existentes = {p['nome'].lower() for p in produtos}
+
+    novos_produtos = []
+    erros = []
+    for numero, linha in enumerate(linhas, start=1):
+        if not isinstance(linha, dict):
+            erros.append(f"Linha {numero}: formato inválido, esperado um objeto (JSON) ou as colunas do cabeçalho (CSV).")
+            continue
+        nome = str(linha.get('nome') or '').strip()
+        if not nome:
+            erros.append(f"Linha {numero}: nome é obrigatório.")
+            continue
+        if nome.lower() in nomes_existentes:
+            erros.append(f"Linha {numero}: produto '{nome}' já cadastrado.")
+            continue
+        try:
+            preco = _numero(linha.get('preco'))
+            quantidade = _inteiro(linha.get('quantidade') or 0)
+            estoque_minimo = _inteiro(linha.get('estoque_minimo') or 10)
+        except (TypeError, ValueError):
+            erros.append(f"Linha {numero}: preço, quantidade ou estoque mínimo inválido.")
+            continue
+        if preco <= 0 or quantidade < 0:
+            erros.append(f"Linha {numero}: preço deve ser positivo e quantidade não pode ser negativa.")
+            continue
+
+        nomes_existentes.add(nome.lower())
+        novos_produtos.append({
+            'nome': nome,
+            'preco': preco,
+            'quantidade': quantidade,
+            'categoria': str(linha.get('categoria', '') or 'Outros').strip(),
+            'estoque_minimo': estoque_minimo
+        })
+
+    if erros:
+        return _responder_lote(False, f'Importação cancelada: {len(erros)} linha(s) com erro.', erros)
+
+    movimentacoes = carregar_dados('movimentacoes')
+    for novo_produto in novos_produtos:
+        novo_produto['id'] = proximo_id('produtos')
+        produtos.append(novo_produto)
+        movimentacoes.append({
+            'id': proximo_id('movimentacoes'),
+            'produto_id': novo_produto['id'],
+            'produto_nome': novo_produto['nome'],
+            'quantidade': novo_produto['quantidade'],
+            'tipo': 'entrada_inicial',
+            'usuario': session['user_nome'],
+            'data': datetime.now().strftime('%d/%m/%Y %H:%M:%S'),
+            'timestamp': datetime.now().timestamp(),
+            'observacao': 'Importação em lote'
+        })
+
+    salvar_dados('produtos', produtos)
+    salvar_dados('movimentacoes', movimentacoes)
+    for novo_produto in novos_produtos:
+        indexar_produto(novo_produto)
+
+    return _responder_lote(True, f'{len(novos_produtos)} produto(s) importado(s) com sucesso!', [])
+
+@app.route('/atualizar_precos', methods=['POST'])
+@login_required
+@permission_required('cadastrar_produtos')
+def atualizar_precos():
+    """Atualiza o preço de vários produtos (por id ou nome) com uma única gravação"""
+    try:
+        linhas = _ler_linhas_lote()
+    except (ValueError, UnicodeDecodeError) as e:
+        return _responder_lote(False, f'Arquivo inválido: {str(e)}', [])
+
+    if not linhas:
+        return _responder_lote(False, 'Nenhum preço para atualizar.', [])
+
+    produtos = carregar_dados('produtos')
+    por_id = {p['id']: p for p in produtos}
+    por_nome = {p['nome'].lower(): p for p in produtos}
+
+    alteracoes = []
+    erros = []
+    for numero, linha in enumerate(linhas, start=1):
+        if not isinstance(linha, dict):
+            erros.append(f"Linha {numero}: formato inválido, esperado um objeto (JSON) ou as colunas do cabeçalho (CSV).")
+            continue
+        produto = None
+        if str(linha.get('id') or '').strip():
+            try:
+                produto = por_id.get(_inteiro(linha['id']))
+            except (TypeError, ValueError):
+                pass
+        elif linha.get('nome'):
+            produto = por_nome.get(str(linha['nome']).strip().lower())
+        if not produto:
+            erros.append(f"Linha {numero}: produto não encontrado.")
+            continue
+        try:
+            preco = _numero(linha.get('preco'))
+        except (TypeError, ValueError):
+            erros.append(f"Linha {numero}: preço inválido.")
+            continue
+        if preco <= 0:
+            erros.append(f"Linha {numero}: preço deve ser positivo.")
+            continue
+        alteracoes.append((produto, preco))
+
+    if erros:
+        return _responder_lote(False, f'Atualização cancelada: {len(erros)} linha(s) com erro.', erros)
+
+    for produto, preco in alteracoes:
+        produto['preco'] = preco
+    salvar_dados('produtos', produtos)
+
+    return _responder_lote(True, f'Preço de {len(alteracoes)} produto(s) atualizado(s) com sucesso!', [])
+
 # ============= PDV =============
 
 @app.route('/pdv')
@@ -454,7 +2125,8 @@ def cadastro_produto():
 @permission_required('realizar_vendas')
 def pdv():
     produtos = carregar_dados('produtos')
-    return render_template('pdv.html', produtos=produtos)
+    # A lista completa fica disponível pela busca (/api/buscar_produtos)
+    return render_template('pdv.html', produtos=produtos[:LIMITE_PRODUTOS_PDV], total_produtos=len(produtos))
 
 @app.route('/processar_venda', methods=['POST'])
 @login_required
@@ -475,13 +2147,14 @@ def processar_venda():
                     if produto['quantidade'] >= pv['quantidade']:
                         produto['quantidade'] -= pv['quantidade']
                         movimentacoes.append({
-                            'id': len(movimentacoes) + 1,
+                            'id': proximo_id('movimentacoes'),
                             'produto_id': produto['id'],
                             'produto_nome': produto['nome'],
                             'quantidade': pv['quantidade'],
                             'tipo': 'saída',
                             'usuario': session['user_nome'],
-                            'data': datetime.now().strftime('%d/%m/%Y %H:%M:%S')
+                            'data': datetime.now().strftime('%d/%m/%Y %H:%M:%S'),
+                            'timestamp': datetime.now().timestamp()
                         })
                     else:
                         return jsonify({'success': False, 'message': f"Estoque insuficiente para {produto['nome']}"}), 400
@@ -489,8 +2162,9 @@ def processar_venda():
 
         vendas = carregar_dados('vendas')
         nova_venda = {
-            'id': len(vendas) + 1,
+            'id': proximo_id('vendas'),
             'data': datetime.now().strftime('%d/%m/%Y %H:%M:%S'),
+            'timestamp': datetime.now().timestamp(),
             'produtos': produtos_vendidos,
             'total': total,
             'vendedor': session['user_nome'],
@@ -518,6 +2192,8 @@ def processar_venda():
         salvar_dados('produtos', produtos)
         salvar_dados('vendas', vendas)
         salvar_dados('movimentacoes', movimentacoes)
+        # Só depois da venda gravada, para o resumo não contar vendas que falharam
+        atualizar_resumo_diario(nova_venda)
 
         return jsonify({'success': True, 'message': 'Venda realizada com sucesso!'})
 
@@ -530,8 +2206,11 @@ def processar_venda():
 @app.route('/pre_venda')
 @login_required
 def pre_venda():
-    users = carregar_dados('users')
-    user = next((u for u in users if u['id'] == session['user_id']), None)
+    # Clientes sempre podem comprar; só a equipe precisa da permissão
+    user = None
+    if session.get('user_tipo') != 'cliente':
+        users = carregar_dados('users')
+        user = next((u for u in users if u['id'] == session['user_id']), None)
     
     if user and user['tipo'] != 'admin' and 'fazer_pedidos' not in user.get('permissoes', []):
         flash("Acesso não autorizado.", "error")
@@ -583,6 +2262,20 @@ def processar_pedido_cliente():
                 except:
                     continue
         
+        # Dia de retirada dentro do período da pré-venda (padrão: último dia)
+        data_retirada = None
+        if pre_venda_ativa and data.get('tipo_pedido') == 'pre_venda':
+            data_retirada = pre_venda_ativa['data_fim']
+            retirada = converter_data(data.get('data_retirada', ''))
+            if retirada is not None:
+                data_retirada = datetime.fromtimestamp(retirada).strftime('%d/%m/%Y')
+                if not (datetime.strptime(pre_venda_ativa['data_inicio'], '%d/%m/%Y') <= datetime.fromtimestamp(retirada)
+                        <= datetime.strptime(pre_venda_ativa['data_fim'], '%d/%m/%Y')):
+                    return jsonify({
+                        'success': False,
+                        'message': f"A retirada deve ser entre {pre_venda_ativa['data_inicio']} e {pre_venda_ativa['data_fim']}"
+                    }), 400
+
         # Aplicar desconto se for uma pré-venda
         produtos_com_desconto = []
         desconto = pre_venda_ativa.get('desconto_geral', 0) if pre_venda_ativa and data.get('tipo_pedido') == 'pre_venda' else 0
@@ -621,13 +2314,14 @@ def processar_pedido_cliente():
                     
                     # Registrar movimentação de saída
                     movimentacoes.append({
-                        'id': len(movimentacoes) + 1,
+                        'id': proximo_id('movimentacoes'),
                         'produto_id': produto_id,
                         'produto_nome': produto_estoque['nome'],
                         'quantidade': quantidade_pedido,
                         'tipo': 'saída',
                         'usuario': session['user_nome'],
                         'data': datetime.now().strftime('%d/%m/%Y %H:%M:%S'),
+                        'timestamp': datetime.now().timestamp(),
                         'observacao': 'Pedido online - ' + ('Pré-venda' if data.get('tipo_pedido') == 'pre_venda' else 'Compra Imediata')
                     })
                 else:
@@ -645,11 +2339,13 @@ def processar_pedido_cliente():
         user_nome = session['user_nome']
 
         # Se for compra imediata, registrar como venda normal
+        nova_venda = None
         if data.get('tipo_pedido') == 'imediato':
             # Registrar como venda normal
             nova_venda = {
-                'id': len(vendas) + 1,
+                'id': proximo_id('vendas'),
                 'data': datetime.now().strftime('%d/%m/%Y %H:%M:%S'),
+                'timestamp': datetime.now().timestamp(),
                 'produtos': produtos_com_desconto,
                 'total': total_com_desconto,
                 'vendedor': user_nome + ' (Online)',
@@ -661,7 +2357,7 @@ def processar_pedido_cliente():
             
             # Também registrar como pedido para histórico
             novo_pedido = {
-                'id': len(pedidos) + 1,
+                'id': proximo_id('pedidos'),
                 'cliente_id': user_id,
                 'cliente_nome': user_nome,
                 'produtos': produtos_com_desconto,
@@ -670,6 +2366,7 @@ def processar_pedido_cliente():
                 'total': total_com_desconto,
                 'status': {'entregue': True, 'pago': True},
                 'data': datetime.now().strftime('%d/%m/%Y %H:%M'),
+                'timestamp': datetime.now().timestamp(),
                 'desconto_aplicado': desconto,
                 'data_entrega': datetime.now().strftime('%d/%m/%Y %H:%M'),
                 'data_pagamento': datetime.now().strftime('%d/%m/%Y %H:%M')
@@ -681,7 +2378,7 @@ def processar_pedido_cliente():
         else:
             # Se for pré-venda, registrar apenas como pedido
             novo_pedido = {
-                'id': len(pedidos) + 1,
+                'id': proximo_id('pedidos'),
                 'cliente_id': user_id,
                 'cliente_nome': user_nome,
                 'produtos': produtos_com_desconto,
@@ -690,7 +2387,10 @@ def processar_pedido_cliente():
                 'total': total_com_desconto,
                 'status': {'entregue': False, 'pago': False},
                 'data': datetime.now().strftime('%d/%m/%Y %H:%M'),
-                'desconto_aplicado': desconto
+                'timestamp': datetime.now().timestamp(),
+                'desconto_aplicado': desconto,
+                'pre_venda_id': pre_venda_ativa['id'] if pre_venda_ativa else None,
+                'data_retirada': data_retirada
             }
             pedidos.append(novo_pedido)
             
@@ -701,6 +2401,9 @@ def processar_pedido_cliente():
         salvar_dados('produtos', produtos)
         salvar_dados('movimentacoes', movimentacoes)
         salvar_dados('vendas', vendas)
+        if nova_venda:
+            atualizar_resumo_diario(nova_venda)
+        indexar_pedido(novo_pedido)
 
         return jsonify({'success': True, 'message': mensagem_sucesso})
 
@@ -751,13 +2454,14 @@ def criar_pre_venda():
     
     # Criar nova pré-venda
     nova_pre_venda = {
-        'id': len(pre_vendas) + 1,
+        'id': proximo_id('pre_vendas'),
         'data_inicio': data_inicio_br,
         'data_fim': data_fim_br,
         'desconto_geral': desconto_geral,
         'ativa': True,
         'criada_por': session['user_nome'],
         'data_criacao': datetime.now().strftime('%d/%m/%Y %H:%M:%S'),
+        'timestamp': datetime.now().timestamp(),
         'pedidos': []
     }
     
@@ -797,7 +2501,7 @@ def verificar_estoque():
 def gerenciar_pre_vendas():
     pre_vendas = carregar_dados('pre_vendas')
     # Ordenar por data de criação (mais recente primeiro)
-    pre_vendas.sort(key=lambda x: x.get('data_criacao', ''), reverse=True)
+    pre_vendas.sort(key=lambda x: timestamp_do_registro(x, 'data_criacao'), reverse=True)
     return render_template('gerenciar_pre_vendas.html', pre_vendas=pre_vendas)
 
 @app.route('/desativar_pre_venda/<int:pre_venda_id>', methods=['POST'])
@@ -856,9 +2560,12 @@ def atualizar_status_pedido(pedido_id):
         action = request.form.get('action')
         
         pedidos = carregar_dados('pedidos')
+        pedido_atualizado = None
         
         for pedido in pedidos:
             if pedido['id'] == pedido_id:
+                pedido_atualizado = pedido
+
                 # Inicializar status se não existir
                 if 'status' not in pedido:
                     pedido['status'] = {'entregue': False, 'pago': False}
@@ -891,12 +2598,14 @@ def atualizar_status_pedido(pedido_id):
                 break
         
         salvar_dados('pedidos', pedidos)
+        if pedido_atualizado:
+            indexar_pedido(pedido_atualizado)
         flash('Status do pedido atualizado com sucesso!', 'success')
         
     except Exception as e:
         flash(f'Erro ao atualizar status: {str(e)}', 'error')
     
-    return redirect(url_for('relatorios_vendas_online'))
+    return _redirecionar_apos_pedido()
 
 @app.route('/excluir_pedido/<int:pedido_id>', methods=['POST'])
 @login_required
@@ -906,33 +2615,119 @@ def excluir_pedido(pedido_id):
         pedidos = carregar_dados('pedidos')
         pedidos = [p for p in pedidos if p['id'] != pedido_id]
         salvar_dados('pedidos', pedidos)
+        desindexar_pedido(pedido_id)
         flash('Pedido excluído com sucesso!', 'success')
     except Exception as e:
         flash(f'Erro ao excluir pedido: {str(e)}', 'error')
     
+    return _redirecionar_apos_pedido()
+
+def _redirecionar_apos_pedido():
+    """Volta para a página de origem (fila de atendimento) ou para o relatório online"""
+    voltar = request.form.get('voltar', '')
+    # Navegadores tratam a barra invertida como '/': '/\outro.site' também sairia do domínio
+    if voltar.startswith('/') and not voltar.startswith('//') and '\\' not in voltar:
+        return redirect(voltar)
     return redirect(url_for('relatorios_vendas_online'))
 
+@app.route('/fila_pre_venda')
+@login_required
+@permission_required('visualizar_relatorios')
+def fila_pre_venda():
+    status = request.args.get('status', 'pendente_pagamento')
+    if status not in STATUS_FILA_PRE_VENDA:
+        status = 'pendente_pagamento'
+    pagina = max(request.args.get('pagina', 1, type=int), 1)
+
+    contadores = contadores_pre_venda()
+    total_paginas = max((contadores[status] + PEDIDOS_POR_PAGINA - 1) // PEDIDOS_POR_PAGINA, 1)
+
+    return render_template('fila_pre_venda.html',
+                         pedidos=pagina_fila_pre_venda(status, pagina),
+                         status=status,
+                         status_fila=STATUS_FILA_PRE_VENDA,
+                         contadores=contadores,
+                         pagina=pagina,
+                         total_paginas=total_paginas)
+
+@app.route('/plano_producao/<int:pre_venda_id>')
+@login_required
+@permission_required('gerenciar_pre_vendas')
+def plano_producao_pre_venda(pre_venda_id):
+    pre_venda = next((pv for pv in carregar_dados('pre_vendas') if pv['id'] == pre_venda_id), None)
+    if not pre_venda:
+        flash('Pré-venda não encontrada!', 'error')
+        return redirect(url_for('gerenciar_pre_vendas'))
+    return render_template('plano_producao.html', pre_venda=pre_venda, dias=plano_producao(pre_venda_id))
+
+@app.route('/api/plano_producao/<int:pre_venda_id>')
+@login_required
+@permission_required('gerenciar_pre_vendas')
+def api_plano_producao(pre_venda_id):
+    dias = plano_producao(pre_venda_id)
+    totais: Dict[int, Dict[str, Any]] = {}
+    for dia in dias:
+        for linha in dia['produtos']:
+            total = totais.setdefault(linha['produto_id'], {'produto_id': linha['produto_id'], 'nome': linha['nome'], 'quantidade': 0})
+            total['quantidade'] += linha['quantidade']
+    return jsonify({
+        'pre_venda_id': pre_venda_id,
+        'dias': dias,
+        'totais': sorted(totais.values(), key=lambda linha: linha['nome'])
+    })
+
+# ============= HISTÓRICO DE PEDIDOS DO CLIENTE =============
+
+@app.route('/meus_pedidos')
+@login_required
+def meus_pedidos():
+    pedidos = pedidos_do_cliente(session['user_id'])
+    return render_template('meus_pedidos.html', pedidos=pedidos)
+
+@app.route('/api/meus_pedidos')
+@login_required
+def api_meus_pedidos():
+    return jsonify(pedidos_do_cliente(session['user_id']))
+
+@app.route('/api/pedidos_cliente/<int:cliente_id>')
+@login_required
+@permission_required('visualizar_relatorios')
+def api_pedidos_cliente(cliente_id):
+    return jsonify(pedidos_do_cliente(cliente_id))
+
 # ============= RELATÓRIOS =============
 
 @app.route('/relatorios')
 @login_required
 @permission_required('visualizar_relatorios')
 def relatorios():
-    vendas = carregar_dados('vendas')
-    movimentacoes = carregar_dados('movimentacoes')
     pontos = carregar_dados('pontos')
-    pedidos = carregar_dados('pedidos')
+
+    # Período opcional (AAAA-MM-DD) para o resumo diário e o histórico
+    inicio = request.args.get('inicio', '')
+    fim = request.args.get('fim', '')
+    resumo_diario = carregar_resumo_periodo(inicio, fim)
+    if inicio or fim:
+        fim_ts = converter_data(fim)
+        periodo = (converter_data(inicio) or 0.0, fim_ts + 86399.999 if fim_ts else float('inf'))
+        vendas = compactar_registros('vendas', registros_no_periodo('vendas', *periodo))
+        movimentacoes = compactar_registros('movimentacoes', registros_no_periodo('movimentacoes', *periodo))
+    else:
+        vendas = carregar_registros('vendas')
+        movimentacoes = carregar_registros('movimentacoes')
     
     # Estatísticas
-    total_vendas = sum(venda['total'] for venda in vendas) if vendas else 0
-    total_pedidos = len(pedidos)
+    total_vendas = sum(r['receita'] for r in resumo_diario)
+    total_pedidos = len(_garantir_indice_tempo('pedidos')['chaves'])
     total_clientes = len([p for p in pontos if p['pontos'] > 0])
     
     return render_template('relatorios.html', 
                          vendas=vendas, 
                          movimentacoes=movimentacoes, 
                          pontos=pontos,
-                         pedidos=pedidos,
+                         resumo_diario=resumo_diario,
+                         inicio=inicio,
+                         fim=fim,
                          total_vendas=total_vendas,
                          total_pedidos=total_pedidos,
                          total_clientes=total_clientes)
@@ -941,28 +2736,19 @@ def relatorios():
 @login_required
 @permission_required('visualizar_relatorios')
 def relatorios_vendas_online():
-    # Executar migração automática ao acessar a página
-    migrar_status_pedidos()
+    # Filtrar apenas pedidos de pré-venda (compactados durante a leitura, sem a lista de dicts)
+    pedidos_pre_venda = [p for p in carregar_registros('pedidos') if p.get('tipo_pedido') == 'pre_venda']
     
-    pedidos = carregar_dados('pedidos')
-    
-    # Filtrar apenas pedidos de pré-venda
-    pedidos_pre_venda = [p for p in pedidos if p.get('tipo_pedido') == 'pre_venda']
-    
-    # Calcular totais
-    total_pedidos = len(pedidos_pre_venda)
-    total_valor = sum(p['total'] for p in pedidos_pre_venda)
-    pedidos_entregues = len([p for p in pedidos_pre_venda if p.get('status', {}).get('entregue', False)])
-    pedidos_pagos = len([p for p in pedidos_pre_venda if p.get('status', {}).get('pago', False)])
-    pedidos_completos = len([p for p in pedidos_pre_venda if p.get('status', {}).get('entregue', False) and p.get('status', {}).get('pago', False)])
+    # Totais mantidos pelo índice da fila de atendimento
+    contadores = contadores_pre_venda()
     
     return render_template('relatorios_vendas_online.html', 
                          pedidos=pedidos_pre_venda,
-                         total_pedidos=total_pedidos,
-                         total_valor=total_valor,
-                         pedidos_entregues=pedidos_entregues,
-                         pedidos_pagos=pedidos_pagos,
-                         pedidos_completos=pedidos_completos)
+                         total_pedidos=contadores['total'],
+                         total_valor=contadores['valor'],
+                         pedidos_entregues=contadores['entregues'],
+                         pedidos_pagos=contadores['pagos'],
+                         pedidos_completos=contadores['completos'])
 
 # ============= ROTAS DE DEBUG =============
 
@@ -1008,7 +2794,7 @@ def inicializar_dados():
                 'id': 1,
                 'nome': 'Pietro',
                 'email': 'pietro@admin.turma.do.forno',
-                'senha': hashlib.sha256('pietro123'.encode()).hexdigest(),
+                'senha': gerar_hash_senha('pietro123'),
                 'tipo': 'admin',
                 'permissoes': ['gerenciar_usuarios', 'visualizar_estoque', 'alterar_estoque', 'realizar_vendas', 'cadastrar_produtos', 'visualizar_relatorios', 'gerenciar_pre_vendas'],
                 'data_criacao': datetime.now().strftime('%d/%m/%Y %H:%M:%S')
@@ -1017,7 +2803,7 @@ def inicializar_dados():
                 'id': 2,
                 'nome': 'Francesco',
                 'email': 'francesco@admin.turma.do.forno',
-                'senha': hashlib.sha256('francesco123'.encode()).hexdigest(),
+                'senha': gerar_hash_senha('francesco123'),
                 'tipo': 'admin',
                 'permissoes': ['gerenciar_usuarios', 'visualizar_estoque', 'alterar_estoque', 'realizar_vendas', 'cadastrar_produtos', 'visualizar_relatorios', 'gerenciar_pre_vendas'],
                 'data_criacao': datetime.now().strftime('%d/%m/%Y %H:%M:%S')
@@ -1038,27 +2824,309 @@ def inicializar_dados():
         salvar_dados('produtos', produtos_iniciais)
 
     # Garantir que os outros arquivos existam
-    carregar_dados('vendas')
+    vendas_data = carregar_dados('vendas')
+    if vendas_data and not carregar_dados('resumo_vendas_diario'):
+        reconstruir_resumo_diario()
     carregar_dados('movimentacoes')
     carregar_dados('pontos')
     carregar_dados('pre_vendas')
     carregar_dados('pedidos')
+    carregar_dados('clientes')
+
+# ============= INTEGRIDADE DOS DADOS =============
+
+def iterar_registros(arquivo: str, tamanho_bloco: int = 1 << 16):
+    """Registros de uma coleção um a um, lendo o arquivo em blocos em vez de carregá-lo inteiro"""
+    caminho = f'database/{arquivo}.json'
+    if not os.path.exists(caminho):
+        return
+    decodificador = json.JSONDecoder()
+    with open(caminho, 'r', encoding='utf-8') as f:
+        buffer = ''
+        while True:
+            bloco = f.read(tamanho_bloco)
+            buffer += bloco
+            posicao = 0
+            while True:
+                while posicao < len(buffer) and buffer[posicao] in ' \t\r\n,[':
+                    posicao += 1
+                if posicao >= len(buffer) or buffer[posicao] == ']':
+                    break
+                try:
+                    registro, posicao = decodificador.raw_decode(buffer, posicao)
+                except json.JSONDecodeError:
+                    # Registro cortado no fim do bloco: espera o próximo
+                    break
+                yield registro
+            buffer = buffer[posicao:]
+            if not bloco:
+                if buffer.strip() not in ('', ']'):
+                    raise ValueError(f"{caminho} malformado perto de {buffer[:40]!r}")
+                return
+
+def _regravar_colecao(arquivo: str, registros) -> None:
+    """Grava a coleção registro a registro, no mesmo formato de salvar_dados"""
+    caminho = f'database/{arquivo}.json'
+    with open(caminho + '.tmp', 'w', encoding='utf-8') as f:
+        f.write('[')
+        vazio = True
+        for registro in registros:
+            f.write('\n    ' if vazio else ',\n    ')
+            f.write(json.dumps(registro, indent=4, ensure_ascii=False).replace('\n', '\n    '))
+            vazio = False
+        f.write(']' if vazio else '\n]')
+    os.replace(caminho + '.tmp', caminho)
+
+def verificar_integridade(reparar: bool = False) -> Dict[str, Any]:
+    """Uma passada por coleção procurando ids duplicados, produto_id órfão nas movimentações,
+    estoque negativo e sequências atrás do maior id. Com reparar=True corrige o que for possível
+    e lista os ids renumerados e as referências que apontavam para eles.
+
+    Lê os arquivos direto do disco: rodar com a aplicação parada.
+    """
+    problemas: Dict[str, List[Dict[str, Any]]] = {
+        'ids_duplicados': [], 'produtos_orfaos': [], 'estoque_negativo': [], 'sequencias_atrasadas': [],
+        # Preenchidos pelo reparo
+        'renumerados': [], 'referencias_ambiguas': []
+    }
+    ids_vistos: Dict[str, set] = {}
+    maiores: Dict[str, int] = {}
+    excluidos: set = set()
+    suspeitos: List[Dict[str, Any]] = []
+
+    for colecao in COLECOES_COM_ID:
+        sequencia = SEQUENCIAS_COMPARTILHADAS.get(colecao, colecao)
+        vistos = ids_vistos.setdefault(sequencia, set())
+        for registro in iterar_registros(colecao):
+            registro_id = registro.get('id')
+            if registro_id in vistos:
+                problemas['ids_duplicados'].append({'colecao': colecao, 'id': registro_id})
+            vistos.add(registro_id)
+            if isinstance(registro_id, int):
+                maiores[sequencia] = max(maiores.get(sequencia, 0), registro_id)
+
+            if colecao == 'produtos':
+                if registro.get('quantidade', 0) < 0:
+                    problemas['estoque_negativo'].append({'produto_id': registro_id, 'nome': registro.get('nome'),
+                                                          'quantidade': registro['quantidade']})
+            elif colecao == 'movimentacoes':
+                if registro.get('tipo') == 'exclusao':
+                    excluidos.add(registro.get('produto_id'))
+                elif registro.get('produto_id') not in ids_vistos['produtos']:
+                    suspeitos.append({'id': registro_id, 'produto_id': registro.get('produto_id'),
+                                      'produto_nome': registro.get('produto_nome')})
+
+    # Movimentações de produtos excluídos (com registro de exclusão) são histórico, não órfãs
+    problemas['produtos_orfaos'] = [m for m in suspeitos if m['produto_id'] not in excluidos]
+
+    sequencias = _carregar_sequencias()
+    for sequencia, maior in maiores.items():
+        if sequencia in sequencias and sequencias[sequencia] < maior:
+            problemas['sequencias_atrasadas'].append({'sequencia': sequencia, 'atual': sequencias[sequencia], 'maior_id': maior})
+
+    if reparar:
+        for sequencia, maior in maiores.items():
+            ajustar_sequencia(sequencia, maior)
+        _reparar_integridade(problemas, excluidos)
+    return problemas
+
+# Onde cada coleção guarda ids de produtos e de contas, para apontar referências a ids renumerados
+REFERENCIAS_PRODUTO = {'movimentacoes': 'produto_id', 'vendas': 'produtos[].id', 'pedidos': 'produtos[].id',
+                       'recebimentos': 'itens[].produto_id'}
+REFERENCIAS_CONTA = {'vendas': 'cliente_id', 'pedidos': 'cliente_id'}
+
+def _reparar_integridade(problemas: Dict[str, List[Dict[str, Any]]], excluidos: set) -> None:
+    duplicados = {p['colecao'] for p in problemas['ids_duplicados']}
+    sequencias_duplicadas = {SEQUENCIAS_COMPARTILHADAS.get(c, c) for c in duplicados}
+    # Ids vistos por sequência (equipe e clientes juntos), como na verificação
+    ids_vistos: Dict[str, set] = {}
+    # Ids e nomes dos produtos como ficam depois do reparo (ids duplicados são renumerados)
+    produtos_por_nome: Dict[str, List[int]] = {}
+    ids_produtos: set = set()
+    correcoes = []
+
+    def corrigir(colecao: str):
+        sequencia = SEQUENCIAS_COMPARTILHADAS.get(colecao, colecao)
+        vistos = ids_vistos.setdefault(sequencia, set())
+        for registro in iterar_registros(colecao):
+            if registro.get('id') in vistos:
+                # A primeira ocorrência fica com o id; as seguintes ganham ids novos
+                novo_id = proximo_id(colecao)
+                problemas['renumerados'].append({'colecao': colecao, 'id_antigo': registro['id'], 'id_novo': novo_id})
+                registro['id'] = novo_id
+            vistos.add(registro.get('id'))
+
+            if colecao == 'produtos':
+                produtos_por_nome.setdefault(registro.get('nome'), []).append(registro['id'])
+                ids_produtos.add(registro['id'])
+            if colecao == 'produtos' and registro.get('quantidade', 0) < 0:
+                correcoes.append({
+                    'produto_id': registro['id'],
+                    'produto_nome': registro.get('nome'),
+                    'quantidade': -registro['quantidade'],
+                    'tipo': 'entrada',
+                    'usuario': 'Verificação de integridade',
+                    'data': datetime.now().strftime('%d/%m/%Y %H:%M:%S'),
+                    'timestamp': datetime.now().timestamp(),
+                    'observacao': f"Estoque negativo ({registro['quantidade']}) zerado"
+                })
+                registro['quantidade'] = 0
+            elif colecao == 'movimentacoes' and registro.get('tipo') != 'exclusao' and \
+                    registro.get('produto_id') not in excluidos and \
+                    registro.get('produto_id') not in ids_produtos:
+                # Órfã: religa pelo nome quando ele identifica um único produto
+                candidatos = produtos_por_nome.get(registro.get('produto_nome'), [])
+                if len(candidatos) == 1:
+                    registro['produto_id'] = candidatos[0]
+            yield registro
+
+        if colecao == 'movimentacoes':
+            for correcao in correcoes:
+                yield {'id': proximo_id('movimentacoes'), **correcao}
+
+    for colecao in COLECOES_COM_ID:
+        if colecao in duplicados or (colecao == 'produtos' and problemas['estoque_negativo']) or \
+                (colecao == 'movimentacoes' and (problemas['produtos_orfaos'] or correcoes)):
+            _regravar_colecao(colecao, corrigir(colecao))
+            persistir_sequencias()
+        elif colecao == 'produtos' or SEQUENCIAS_COMPARTILHADAS.get(colecao, colecao) in sequencias_duplicadas:
+            # Sem regravar: só registra os ids (e nomes dos produtos) para os duplicados das coleções seguintes
+            for _ in corrigir(colecao):
+                pass
+
+    _apontar_referencias_ambiguas(problemas)
+
+def _apontar_referencias_ambiguas(problemas: Dict[str, List[Dict[str, Any]]]) -> None:
+    """Referências ao id antigo de um produto ou conta renumerado: podem ser do registro que ficou
+    com o id ou do que foi renumerado, então só uma pessoa decide"""
+    produtos = {r['id_antigo'] for r in problemas['renumerados'] if r['colecao'] == 'produtos'}
+    contas = {r['id_antigo'] for r in problemas['renumerados'] if r['colecao'] in SEQUENCIAS_COMPARTILHADAS}
+    if not produtos and not contas:
+        return
+    for colecao in dict.fromkeys([*REFERENCIAS_PRODUTO, *REFERENCIAS_CONTA]):
+        for registro in iterar_registros(colecao):
+            if registro.get('usuario') == 'Verificação de integridade':
+                # Correções criadas pelo próprio reparo já usam os ids novos
+                continue
+            referencias = []
+            campo_produto = REFERENCIAS_PRODUTO.get(colecao)
+            if campo_produto and produtos:
+                if '[]' in campo_produto:
+                    lista, campo = campo_produto.split('[].')
+                    referencias += [(campo_produto, item.get(campo)) for item in registro.get(lista) or []
+                                    if item.get(campo) in produtos]
+                elif registro.get(campo_produto) in produtos:
+                    referencias.append((campo_produto, registro[campo_produto]))
+            campo_conta = REFERENCIAS_CONTA.get(colecao)
+            if campo_conta and registro.get(campo_conta) in contas:
+                referencias.append((campo_conta, registro[campo_conta]))
+            for campo, valor in referencias:
+                problemas['referencias_ambiguas'].append({'colecao': colecao, 'id': registro.get('id'),
+                                                          'campo': campo, 'valor': valor})
+
+@app.cli.command('verificar-integridade')
+@click.option('--reparar', is_flag=True, help='Corrige ids duplicados, movimentações órfãs e estoque negativo')
+def verificar_integridade_command(reparar):
+    """Verifica a integridade de todas as coleções (rodar com a aplicação parada)"""
+    problemas = verificar_integridade(reparar)
+    for tipo, ocorrencias in problemas.items():
+        print(f"{'⚠️ ' if ocorrencias else '✅'} {tipo}: {len(ocorrencias)}")
+        for ocorrencia in ocorrencias[:20]:
+            print(f"   {ocorrencia}")
+    if reparar:
+        print("🔧 Reparo concluído; rode novamente para conferir o que sobrou")
+
+# ============= INICIALIZAÇÃO E AQUECIMENTO =============
+
+_aquecimento: Dict[str, Any] = {'disparado': False, 'pronto': False, 'etapa': None, 'inicio': None, 'duracao': None, 'erro': None}
+_trava_aquecimento = threading.Lock()
+
+def dados_atualizados() -> bool:
+    """Checagem barata: arquivos principais existem e já passaram pelas migrações desta versão"""
+    if not all(os.path.exists(f'database/{colecao}.json') for colecao in ('users', 'produtos')):
+        return False
+    try:
+        with open(ARQUIVO_VERSAO_DADOS, 'r', encoding='utf-8') as f:
+            return json.load(f).get('versao') == VERSAO_DADOS
+    except (FileNotFoundError, json.JSONDecodeError, AttributeError):
+        return False
+
+def preparar_dados() -> None:
+    """Cria os dados iniciais e roda as migrações, gravando a versão alcançada"""
+    inicializar_dados()
+    migrar_clientes()
+    migrar_status_pedidos()
+    migrar_timestamps()
+    with open(ARQUIVO_VERSAO_DADOS, 'w', encoding='utf-8') as f:
+        json.dump({'versao': VERSAO_DADOS, 'data': datetime.now().strftime('%d/%m/%Y %H:%M:%S')}, f, indent=4)
+
+def aquecer_dados() -> None:
+    """Gera os assets e monta os índices em memória antes que as rotas precisem deles"""
+    etapas = [
+        ('assets', construir_assets),
+        ('checkpoint_estoque', criar_checkpoint_se_necessario),
+        ('produtos', _garantir_indice_produtos),
+        *[(f'tempo_{colecao}', lambda colecao=colecao: _garantir_indice_tempo(colecao)) for colecao in COLECOES_TEMPORAIS],
+        *[(f'contas_{colecao}', lambda colecao=colecao: _garantir_indice_contas(colecao)) for colecao in ('users', 'clientes')],
+        ('pedidos_cliente', _garantir_indice_pedidos_cliente),
+        ('fila_pre_venda', _garantir_fila_pre_venda),
+        ('plano_producao', _garantir_plano_producao),
+    ]
+    _aquecimento['inicio'] = time.perf_counter()
+    try:
+        for nome, etapa in etapas:
+            _aquecimento['etapa'] = nome
+            etapa()
+        _aquecimento['pronto'] = True
+    except Exception as e:
+        # As rotas continuam montando os índices sob demanda
+        _aquecimento['erro'] = str(e)
+        print(f"❌ Erro no aquecimento ({_aquecimento['etapa']}): {e}")
+    _aquecimento['etapa'] = None
+    _aquecimento['duracao'] = round(time.perf_counter() - _aquecimento['inicio'], 3)
+
+def iniciar_aplicacao(aquecer: bool = True) -> None:
+    """Só migra quando a versão dos dados mudou; o resto é carregado sob demanda e aquecido em segundo plano"""
+    with _trava_aquecimento:
+        if _aquecimento['disparado']:
+            return
+        os.makedirs('database', exist_ok=True)
+        if not dados_atualizados():
+            preparar_dados()
+        if not aquecer:
+            return
+        _aquecimento['disparado'] = True
+    threading.Thread(target=aquecer_dados, name='aquecimento', daemon=True).start()
+
+@app.before_request
+def _garantir_aquecimento() -> None:
+    # Roda na primeira requisição de cada processo (o próprio /pronto dispara), nunca nos comandos da CLI
+    if not _aquecimento['disparado']:
+        iniciar_aplicacao()
+
+@app.route('/pronto')
+def pronto():
+    """Prontidão para balanceadores e terminais: 200 quando os índices estão aquecidos"""
+    estado = {
+        'pronto': _aquecimento['pronto'],
+        'etapa': _aquecimento['etapa'],
+        'duracao': _aquecimento['duracao'],
+        'erro': _aquecimento['erro'],
+        'versao_dados': VERSAO_DADOS
+    }
+    return jsonify(estado), 200 if estado['pronto'] else 503
 
 if __name__ == '__main__':
     # Garantir que as pastas existam
-    os.makedirs('database', exist_ok=True)
     os.makedirs('templates', exist_ok=True)
-    
-    # Inicializar dados
+
+    # Migra antes de atender; com o reloader do modo debug, só o processo que atende aquece os índices
     with app.app_context():
-        inicializar_dados()
-        # Executar migração na inicialização
-        migrar_status_pedidos()
+        iniciar_aplicacao(aquecer=os.environ.get('WERKZEUG_RUN_MAIN') == 'true')
     
     print("="*60)
     print("🚀 Servidor Flask iniciado!")
-    print("📊 Dados inicializados")
-    print("🔄 Migração de status executada")
+    print("📊 Dados verificados (índices aquecendo em segundo plano, veja /pronto)")
     print("🌐 URL: http://localhost:5001")
     print("="*60)
     
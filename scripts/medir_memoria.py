@@ -0,0 +1,87 @@
+"""Compara a memória das coleções de histórico carregadas como dicts e como registros compactos.
+
+Gera um histórico sintético numa pasta temporária e mede, com tracemalloc, a memória que fica
+retida depois da carga e o pico durante ela:
+
+    python scripts/medir_memoria.py --quantidade 100000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+# A medição usa a leitura direta do arquivo, sem o cache da escrita adiada
+os.environ['PADARIA_ESCRITA_ADIADA'] = '0'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import app  # noqa: E402
+
+
+def gerar_historico_sintetico(quantidade: int) -> Dict[str, List[Dict[str, Any]]]:
+    nomes = [f'Produto {i}' for i in range(200)]
+    usuarios = ['Pietro', 'Francesco', 'Caixa 1', 'Caixa 2']
+    agora = datetime.now()
+    data = agora.strftime('%d/%m/%Y %H:%M:%S')
+    dados: Dict[str, List[Dict[str, Any]]] = {'vendas': [], 'movimentacoes': [], 'pedidos': []}
+    for i in range(quantidade):
+        nome = random.choice(nomes)
+        usuario = random.choice(usuarios)
+        item = {'id': i % 200, 'nome': nome, 'preco': 4.5, 'quantidade': 2}
+        dados['movimentacoes'].append({'id': i, 'produto_id': i % 200, 'produto_nome': nome, 'quantidade': 2,
+                                       'tipo': 'saída', 'usuario': usuario, 'data': data, 'timestamp': agora.timestamp()})
+        dados['vendas'].append({'id': i, 'data': data, 'timestamp': agora.timestamp(), 'produtos': [item], 'total': 9.0,
+                                'vendedor': usuario, 'cpf_cliente': ''})
+        dados['pedidos'].append({'id': i, 'cliente_id': i % 500, 'cliente_nome': usuario, 'produtos': [item],
+                                 'metodo_pagamento': 'pix', 'tipo_pedido': 'pre_venda', 'total': 9.0,
+                                 'status': {'entregue': False, 'pago': False}, 'data': data,
+                                 'timestamp': agora.timestamp(), 'desconto_aplicado': 0})
+    return dados
+
+
+def medir(carga: Callable[[], Any]) -> Tuple[int, int]:
+    """(memória retida pelo resultado, pico durante a carga) em bytes"""
+    tracemalloc.start()
+    resultado = carga()
+    retida, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del resultado
+    return retida, pico
+
+
+def medir_memoria_registros(quantidade: int) -> Dict[str, Dict[str, Tuple[int, int]]]:
+    medidas = {}
+    with tempfile.TemporaryDirectory() as pasta:
+        anterior = os.getcwd()
+        os.chdir(pasta)
+        try:
+            for colecao, registros in gerar_historico_sintetico(quantidade).items():
+                app.salvar_dados(colecao, registros)
+                del registros
+                medidas[colecao] = {
+                    'dict': medir(lambda: app.carregar_dados(colecao)),
+                    'dict + compacto': medir(lambda: app.compactar_registros(colecao, app.carregar_dados(colecao))),
+                    'compacto': medir(lambda: app.carregar_registros(colecao)),
+                }
+        finally:
+            os.chdir(anterior)
+    return medidas
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--quantidade', type=int, default=100000, help='registros sintéticos por coleção')
+    args = parser.parse_args()
+
+    mib = 2 ** 20
+    for colecao, medidas in medir_memoria_registros(args.quantidade).items():
+        print(f'{colecao}:')
+        for forma, (retida, pico) in medidas.items():
+            print(f'  {forma:<16} retida {retida / mib:7.1f} MiB   pico {pico / mib:7.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
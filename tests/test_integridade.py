@@ -0,0 +1,74 @@
+"""Snapshots da verificação e do reparo de integridade sobre a base de exemplo em fixtures/integridade.
+
+Para regravar os snapshots depois de uma mudança intencional: ATUALIZAR_SNAPSHOTS=1 python -m pytest tests
+"""
+import json
+import os
+import shutil
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import app  # noqa: E402
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'integridade', 'database')
+SNAPSHOTS = os.path.join(os.path.dirname(__file__), 'snapshots')
+
+
+def conferir_snapshot(nome, valor):
+    caminho = os.path.join(SNAPSHOTS, f'{nome}.json')
+    if os.environ.get('ATUALIZAR_SNAPSHOTS') == '1' or not os.path.exists(caminho):
+        with open(caminho, 'w', encoding='utf-8') as f:
+            json.dump(valor, f, indent=4, ensure_ascii=False)
+            f.write('\n')
+    with open(caminho, 'r', encoding='utf-8') as f:
+        assert json.loads(json.dumps(valor, ensure_ascii=False)) == json.load(f)
+
+
+def sem_horario(registros):
+    # As correções criadas pelo reparo levam o horário em que ele rodou
+    return [{k: v for k, v in r.items() if not (r.get('usuario') == 'Verificação de integridade' and k in ('data', 'timestamp'))}
+            for r in registros]
+
+
+@pytest.fixture
+def base(tmp_path, monkeypatch):
+    shutil.copytree(FIXTURE, tmp_path / 'database')
+    monkeypatch.chdir(tmp_path)
+    app._sequencias.clear()
+    app._sequencias_gravadas.clear()
+    yield tmp_path
+    app._sequencias.clear()
+    app._sequencias_gravadas.clear()
+
+
+def test_verificacao(base):
+    conferir_snapshot('integridade_verificacao', app.verificar_integridade())
+
+
+def test_verificacao_nao_altera_arquivos(base):
+    antes = {nome: (base / 'database' / nome).read_text(encoding='utf-8') for nome in os.listdir(base / 'database')}
+    app.verificar_integridade()
+    depois = {nome: (base / 'database' / nome).read_text(encoding='utf-8') for nome in os.listdir(base / 'database')}
+    assert antes == depois
+
+
+def test_reparo(base):
+    conferir_snapshot('integridade_reparo', app.verificar_integridade(reparar=True))
+    colecoes = {colecao: sem_horario(list(app.iterar_registros(colecao)))
+                for colecao in ('produtos', 'users', 'clientes', 'movimentacoes')}
+    with open('database/sequencias.json', 'r', encoding='utf-8') as f:
+        colecoes['sequencias'] = json.load(f)
+    conferir_snapshot('integridade_reparo_colecoes', colecoes)
+
+
+def test_reverificacao_apos_reparo(base):
+    app.verificar_integridade(reparar=True)
+    conferir_snapshot('integridade_apos_reparo', app.verificar_integridade())
+
+
+def test_iterar_registros_em_blocos_pequenos(base):
+    with open('database/movimentacoes.json', 'r', encoding='utf-8') as f:
+        esperado = json.load(f)
+    assert list(app.iterar_registros('movimentacoes', tamanho_bloco=7)) == esperado